@@ -1,41 +1,86 @@
 from __future__ import annotations
 
+import atexit
 import hmac
 import json
 import logging
+import mimetypes
+import mmap
 import os
+import queue
 import sqlite3
 import subprocess
 import threading
+import time
 
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
     pass  # python-dotenv が未インストールの場合はスキップ
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
 from datetime import datetime
-from hashlib import sha256
+from hashlib import blake2b, sha256
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
 
 from flask import (
     Flask,
+    Response,
     abort,
     jsonify,
-    render_template_string,
     request,
     send_from_directory,
-    url_for,
 )
-from werkzeug.utils import safe_join
 
 try:
     from PIL import Image
 except ImportError:  # Pillow is optional; thumbnail generation degrades gracefully.
     Image = None
 
+try:
+    import pyvips
+except (ImportError, OSError):  # pyvips (and libvips) is optional; image thumbnails fall back to Pillow.
+    pyvips = None
+else:
+    # libvips の INFO 出力（VIPS: reduceh... など）がサムネイルごとに webviewer.log へ流れないようにする
+    logging.getLogger("pyvips").setLevel(logging.WARNING)
+    PYVIPS_STRIP_OPTIONS = {"keep": "none"} if pyvips.at_least_libvips(8, 15) else {"strip": True}
+
+try:
+    import av
+except ImportError:  # PyAV is optional; video durations fall back to the ffprobe subprocess.
+    av = None
+
+try:
+    from hashlib import file_digest
+except ImportError:  # Python 3.10 以前には file_digest がないので mmap で読む
+    file_digest = None
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:  # sortedcontainers is optional; low-rated queries fall back to a linear scan.
+    SortedList = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash is optional; only needed for HASH_ALGO=xxh3_128.
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:  # blake3 is optional; only needed for HASH_ALGO=blake3.
+    blake3 = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; falls back to Flask's stdlib-based jsonify.
+    orjson = None
+
 
 APP_ROOT = Path(__file__).resolve().parent
 METADATA_ROOT = APP_ROOT / "_metadata"
@@ -50,11 +95,30 @@ FFMPEG_BINARY = os.environ.get("FFMPEG_BIN", "ffmpeg")
 FFPROBE_BINARY = os.environ.get("FFPROBE_BIN", "ffprobe")
 BASIC_AUTH_USERNAME = os.environ.get("BASIC_AUTH_USERNAME", "")
 BASIC_AUTH_PASSWORD = os.environ.get("BASIC_AUTH_PASSWORD", "")
+# Apache (mod_xsendfile) や lighttpd の背後で動かすときに USE_X_SENDFILE=1 を指定すると、
+# /media などのファイル本体は X-Sendfile ヘッダーで前段のサーバーに送らせ、Python では読まない。
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
 VIDEO_PREVIEW_COUNT = 8
 PREVIEW_STEP_SECONDS = 2
 PREVIEW_START_SECONDS = 10
 THUMB_WIDTH = 360
-HASH_CHUNK_SIZE = 4 * 1024 * 1024
+# サムネイル・プレビューの保存形式。webp は ffmpeg に libwebp がなければ起動時に jpg へ切り替える（resolve_thumb_format）。
+THUMB_FORMAT = "jpg" if os.environ.get("THUMB_FORMAT", "webp").lower() in ("jpg", "jpeg") else "webp"
+# ffmpeg のハードウェアデコード。FFMPEG_HWACCEL=auto / cuda / vaapi / qsv などを指定すると有効になる。
+# 入力ごとにデバイスを初期化するので、短い動画ばかりだとかえって遅くなることがあり、既定では使わない。
+FFMPEG_HWACCEL = os.environ.get("FFMPEG_HWACCEL", "").strip().lower()
+HASH_CHUNK_SIZE = 64 * 1024 * 1024
+SMALL_FILE_HASH_LIMIT = 1024 * 1024
+# mmap できないときに read でハッシュする場合の 1 回の読み込みサイズ
+HASH_READ_SIZE = 1024 * 1024
+# これ以上のファイルは mmap してハッシュする（ユーザー空間へのコピーを省く）。
+# Windows では mmap の扱いが異なるので使わず、file_digest で読む。
+MMAP_HASH_THRESHOLD = 10 * 1024 * 1024
+MMAP_HASH_ENABLED = os.name != "nt"
+MADV_SEQUENTIAL = getattr(mmap, "MADV_SEQUENTIAL", None)
+SMALL_FILE_HASH_BATCH = 16
+# 走査時のハッシュ計算・ffmpeg の並列数。HDD などで同時読み込みを減らしたいときは SCAN_WORKERS で指定する。
+SCAN_WORKERS = max(1, int(os.environ.get("SCAN_WORKERS", "0")) or min(8, os.cpu_count() or 1))
 
 # Configure logging
 # Ensure the metadata directory exists so the log file can be opened.
@@ -68,16 +132,38 @@ logging.basicConfig(
         RotatingFileHandler(LOG_FILE, maxBytes=10*1024*1024, backupCount=5)
     ]
 )
+# 書式で使わないスレッド名・プロセス情報はレコード生成時に集めない
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+mimetypes.add_type("image/webp", ".webp")
 
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
-VIDEO_EXTENSIONS = {".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v"}
-MEDIA_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"})
+VIDEO_EXTENSIONS = frozenset({".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v"})
+# 拡張子から media_type を 1 回の辞書引きで決める（走査時に画像か動画かを判定し直さないため）
+EXT_TO_TYPE: Dict[str, str] = {
+    **{ext: "image" for ext in IMAGE_EXTENSIONS},
+    **{ext: "video" for ext in VIDEO_EXTENSIONS},
+}
+
+# MediaEntry の URL は url_for を通さずこの接頭辞から直接組み立てるので、ルート定義も同じ値を使う
+THUMB_URL_PREFIX = "/thumbnails/"
+PREVIEW_URL_PREFIX = "/previews/"
+MEDIA_URL_PREFIX = "/media/"
+VIEW_URL_PREFIX = "/view/"
 
 
 def log(message: str) -> None:
     logging.info(message)
 
 
+def media_suffix(name: str) -> str:
+    """Path(name).suffix.lower() と同じ結果を、Path を作らずに文字列操作だけで返す。"""
+    dot = name.rfind(".")
+    return name[dot:].lower() if 0 < dot < len(name) - 1 else ""
+
+
 def ensure_metadata_tree() -> None:
     if not METADATA_ROOT.exists():
         log("_metadata フォルダが存在しません。作成します。")
@@ -87,9 +173,11 @@ def ensure_metadata_tree() -> None:
 
 
 def init_db() -> None:
-    import time
     ensure_metadata_tree()
-    with sqlite3.connect(DB_PATH) as conn:
+    # 初期化用の接続は使い終わったら閉じる。WAL はデータベースファイルに記録されるので、
+    # 移行処理の書き込みも含めて最初から WAL で行う
+    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS ratings (
@@ -129,80 +217,296 @@ def init_db() -> None:
             conn.commit()
             log("created_at カラムの追加が完了しました。")
 
+        # ハッシュ・動画情報のキャッシュ。差分の行だけを書き込めるようにテーブルで持つ
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS hash_cache (
+                path TEXT PRIMARY KEY,
+                sig TEXT NOT NULL,
+                hash TEXT NOT NULL
+            );
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS video_info (
+                hash TEXT PRIMARY KEY,
+                duration REAL NOT NULL
+            );
+            """
+        )
+
+        # fetch_metadata の JOIN をテーブル本体を読まずにインデックスだけで済ませる
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ratings_metadata ON ratings(hash, score, play_count, created_at)"
+        )
+
+
+def open_db() -> sqlite3.Connection:
+    """アプリ全体で共有する接続を開く。書き込みは DB_LOCK で直列化する。"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA cache_size=-20000;
+        """
+    )
+    return conn
+
+
+def close_db() -> None:
+    flush_counter_queue()
+    # 書き込みスレッドが取り出し済みのバッチも、コミットし終えるまで待つ
+    COUNTER_QUEUE.join()
+    with DB_LOCK:
+        DB.execute("PRAGMA optimize")
+        DB.close()
+
 
 init_db()
 
+DB_LOCK = threading.Lock()
+DB = open_db()
+atexit.register(close_db)
+
+
+def execute_batch(sql: str, rows: List[Tuple]) -> None:
+    """rows を 1 トランザクションでまとめて書き込む。"""
+    with DB_LOCK:
+        DB.execute("BEGIN")
+        try:
+            DB.executemany(sql, rows)
+        except Exception:
+            DB.execute("ROLLBACK")
+            raise
+        DB.execute("COMMIT")
+
 
 def load_json(path: Path) -> Dict[str, Dict[str, float]]:
     if not path.exists():
         return {}
     try:
+        if orjson is not None:
+            return orjson.loads(path.read_bytes())
         with path.open("r", encoding="utf-8") as handle:
             return json.load(handle)
-    except json.JSONDecodeError:
+    except json.JSONDecodeError:  # orjson.JSONDecodeError もこのサブクラス
         return {}
 
 
-def dump_json(path: Path, payload: Dict[str, Dict[str, float]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, ensure_ascii=False, indent=2)
+def migrate_json_caches() -> None:
+    """旧バージョンの JSON キャッシュをテーブルへ一度だけ取り込み、取り込んだファイルは名前を変えて残す。"""
+    if HASH_CACHE_PATH.exists():
+        payload = load_json(HASH_CACHE_PATH)
+        execute_batch(
+            "INSERT OR IGNORE INTO hash_cache(path, sig, hash) VALUES(?, ?, ?)",
+            [(key, value["sig"], value["hash"]) for key, value in payload.items() if "sig" in value and "hash" in value],
+        )
+        HASH_CACHE_PATH.rename(HASH_CACHE_PATH.with_name(HASH_CACHE_PATH.name + ".migrated"))
+        log(f"{HASH_CACHE_PATH.name} をデータベースへ移行しました。")
+    if VIDEO_INFO_PATH.exists():
+        payload = load_json(VIDEO_INFO_PATH)
+        execute_batch(
+            "INSERT OR IGNORE INTO video_info(hash, duration) VALUES(?, ?)",
+            [(key, value["duration"]) for key, value in payload.items() if value.get("duration") is not None],
+        )
+        VIDEO_INFO_PATH.rename(VIDEO_INFO_PATH.with_name(VIDEO_INFO_PATH.name + ".migrated"))
+        log(f"{VIDEO_INFO_PATH.name} をデータベースへ移行しました。")
+
+
+def load_hash_cache() -> Dict[str, Tuple[str, str]]:
+    # 1 件ごとに dict を作らず (sig, hash) のタプルで保持し、起動時の構築コストとメモリを抑える
+    with DB_LOCK:
+        cursor = DB.execute("SELECT path, sig, hash FROM hash_cache")
+        cursor.arraysize = 4096
+        cache: Dict[str, Tuple[str, str]] = {}
+        while rows := cursor.fetchmany():
+            for path, sig, file_hash in rows:
+                cache[path] = (sig, file_hash)
+    return cache
+
+
+def load_video_info_cache() -> Dict[str, Dict[str, float]]:
+    with DB_LOCK:
+        rows = DB.execute("SELECT hash, duration FROM video_info").fetchall()
+    return {media_hash: {"duration": duration} for media_hash, duration in rows}
+
 
+migrate_json_caches()
 
+# *_DIRTY には前回の flush 以降に変更されたキーを溜め、その行だけを書き込む
 HASH_CACHE_LOCK = threading.Lock()
-HASH_CACHE = load_json(HASH_CACHE_PATH)
-HASH_CACHE_DIRTY = False
+HASH_CACHE = load_hash_cache()
+HASH_CACHE_DIRTY: Set[str] = set()
 
 VIDEO_INFO_LOCK = threading.Lock()
-VIDEO_INFO_CACHE = load_json(VIDEO_INFO_PATH)
-VIDEO_INFO_DIRTY = False
-
-
-def compute_file_hash(path: Path) -> str:
-    global HASH_CACHE_DIRTY
-    stat = path.stat()
-    cache_key = str(path)
-    signature = f"{stat.st_mtime_ns}:{stat.st_size}"
-    cached = HASH_CACHE.get(cache_key)
-    if cached and cached.get("sig") == signature:
-        return cached["hash"]
-
-    digest = sha256()
-    with path.open("rb") as handle:
-        while chunk := handle.read(HASH_CHUNK_SIZE):
-            digest.update(chunk)
-    file_hash = digest.hexdigest()
-    with HASH_CACHE_LOCK:
-        HASH_CACHE[cache_key] = {"sig": signature, "hash": file_hash}
-        HASH_CACHE_DIRTY = True
-    return file_hash
+VIDEO_INFO_CACHE = load_video_info_cache()
+VIDEO_INFO_DIRTY: Set[str] = set()
+
+
+def resolve_hash_factory(name: str) -> Tuple[str, Callable[[], object]]:
+    """HASH_ALGO の名前からハッシュオブジェクトを作る関数を返す。使えない指定は sha256 にする。"""
+    # 内容の識別に使うだけなので usedforsecurity=False を付け、OpenSSL が速い実装を選べるようにする
+    if name == "blake2b":
+        return name, lambda: blake2b(digest_size=16, usedforsecurity=False)
+    if name == "xxh3_128":
+        if xxhash is not None:
+            return name, xxhash.xxh3_128
+        log("xxhash がインストールされていないため sha256 を使います。")
+    elif name == "blake3":
+        if blake3 is not None:
+            # 大きな update は blake3 側で複数スレッドに分けて処理させる
+            return name, lambda: blake3.blake3(max_threads=blake3.blake3.AUTO)
+        log("blake3 がインストールされていないため sha256 を使います。")
+    elif name != "sha256":
+        log(f"未対応の HASH_ALGO です: {name}（sha256 を使います）")
+    return "sha256", lambda: sha256(usedforsecurity=False)
+
+
+def log_hash_acceleration() -> None:
+    """SHA 拡張命令 (sha_ni) が CPU にあるかを起動時に記録しておく（Linux のみ判定）。"""
+    if HASH_ALGO != "sha256":
+        return
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as handle:
+            flags = next((line.split(":", 1)[1].split() for line in handle if line.startswith("flags")), [])
+    except OSError:
+        return
+    if "sha_ni" in flags:
+        log("ハッシュ: sha256 (CPU の SHA 拡張命令 sha_ni を利用可能)")
+    else:
+        log("ハッシュ: sha256 (この CPU には sha_ni がないため、速度が必要なら HASH_ALGO=blake3 / blake2b を検討してください)")
 
 
-def flush_hash_cache() -> None:
-    global HASH_CACHE_DIRTY
-    if not HASH_CACHE_DIRTY:
-        return
+# ハッシュは評価・サムネイルのキーなので、既存のデータを引き継げるよう既定は sha256 のままにする。
+# 別のアルゴリズムに切り替えると、評価やサムネイルは新しいハッシュに対して作り直しになる。
+HASH_ALGO, HASH_FACTORY = resolve_hash_factory(os.environ.get("HASH_ALGO", "sha256").lower())
+# キャッシュの sig にアルゴリズム名を含め、切り替え後は前のアルゴリズムの値を使わないようにする
+HASH_SIG_PREFIX = "" if HASH_ALGO == "sha256" else f"{HASH_ALGO}:"
+log_hash_acceleration()
+
+
+def hash_signature(stat: os.stat_result) -> str:
+    return f"{HASH_SIG_PREFIX}{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def hash_file_contents(path: Path, size: int) -> str:
+    if size <= SMALL_FILE_HASH_LIMIT:
+        # 小さいファイルは mmap の準備コストの方が大きいので一度に読み込んで渡す。
+        # バッファ付きファイルオブジェクトは作らず、os.read で直接読む（通常は 1 回の read で終わる）。
+        digest = HASH_FACTORY()
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            while chunk := os.read(fd, SMALL_FILE_HASH_LIMIT + 1):
+                digest.update(chunk)
+        finally:
+            os.close(fd)
+    elif file_digest is not None and (size < MMAP_HASH_THRESHOLD or not MMAP_HASH_ENABLED):
+        # 読み込みと更新のループは file_digest に任せ、ファイルの終わりまで一度の呼び出しで済ませる。
+        with path.open("rb") as handle:
+            digest = file_digest(handle, HASH_FACTORY)
+    else:
+        with path.open("rb") as handle:
+            try:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, OverflowError, ValueError) as exc:
+                # mmap に対応しないファイルシステム（一部のネットワークドライブなど）や、
+                # アドレス空間が足りない 32 ビット環境では通常の読み込みでハッシュする
+                log(f"mmap できないため通常の読み込みでハッシュします: {path} - {exc}")
+                digest = hash_stream(handle)
+            else:
+                digest = HASH_FACTORY()
+                # mmap したバッファを OpenSSL に直接渡し、Python 側の read ループとコピーを省く。
+                # 巨大ファイルでのメモリ圧迫を避けるため HASH_CHUNK_SIZE 単位のスライスで渡す。
+                with mapped:
+                    if MADV_SEQUENTIAL is not None:
+                        # 先頭から順に読むことをカーネルに伝え、先読みを大きくしてもらう
+                        mapped.madvise(MADV_SEQUENTIAL)
+                    with memoryview(mapped) as view:
+                        for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                            digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+def hash_stream(handle) -> object:
+    """開いたファイルを末尾まで読みながらハッシュする（mmap を使えないときの経路）。"""
+    if file_digest is not None:
+        return file_digest(handle, HASH_FACTORY)
+    digest = HASH_FACTORY()
+    while chunk := handle.read(HASH_READ_SIZE):
+        digest.update(chunk)
+    return digest
+
+
+def flush_hash_cache(live_keys: Optional[Set[str]] = None) -> None:
+    """更新分を書き込む。live_keys を渡すと、それに含まれないパス（削除・移動済み）の行も消す。"""
     with HASH_CACHE_LOCK:
-        dump_json(HASH_CACHE_PATH, HASH_CACHE)
-        HASH_CACHE_DIRTY = False
+        stale = [key for key in HASH_CACHE if key not in live_keys] if live_keys is not None else []
+        for key in stale:
+            del HASH_CACHE[key]
+            HASH_CACHE_DIRTY.discard(key)
+        rows = [(key, *HASH_CACHE[key]) for key in HASH_CACHE_DIRTY]
+        HASH_CACHE_DIRTY.clear()
+    if stale:
+        execute_batch("DELETE FROM hash_cache WHERE path = ?", [(key,) for key in stale])
+    if rows:
+        execute_batch("INSERT OR REPLACE INTO hash_cache(path, sig, hash) VALUES(?, ?, ?)", rows)
 
 
 def flush_video_info_cache() -> None:
-    global VIDEO_INFO_DIRTY
-    if not VIDEO_INFO_DIRTY:
-        return
     with VIDEO_INFO_LOCK:
-        dump_json(VIDEO_INFO_PATH, VIDEO_INFO_CACHE)
-        VIDEO_INFO_DIRTY = False
+        if not VIDEO_INFO_DIRTY:
+            return
+        rows = [(key, VIDEO_INFO_CACHE[key]["duration"]) for key in VIDEO_INFO_DIRTY]
+        VIDEO_INFO_DIRTY.clear()
+    execute_batch("INSERT OR REPLACE INTO video_info(hash, duration) VALUES(?, ?)", rows)
 
 
 def generate_image_thumbnail(src: Path, dest: Path) -> None:
+    if pyvips is not None:
+        # libvips は JPEG の shrink-on-load で必要な解像度だけをデコードする
+        try:
+            # EXIF などのメタデータはサムネイルに不要なので落とす（libvips 8.15 以降は strip が非推奨で keep を使う）
+            thumb = pyvips.Image.thumbnail(str(src), THUMB_WIDTH, height=THUMB_WIDTH)
+            thumb.write_to_file(str(dest), Q=THUMB_QUALITY, **PYVIPS_STRIP_OPTIONS)
+            return
+        except pyvips.Error as exc:
+            log(f"pyvips でのサムネイル生成に失敗したため Pillow で再試行します: {src} - {exc}")
     if Image is None:
         dest.write_bytes(src.read_bytes())
         return
     with Image.open(src) as img:
-        img.thumbnail((THUMB_WIDTH, THUMB_WIDTH))
-        img.convert("RGB").save(dest, format="JPEG", quality=85)
+        # JPEG は draft で libjpeg の縮小デコード（DCT 領域での 1/2〜1/8）を使い、RGB への変換もデコード時に済ませる。
+        # 仕上げの縮小で画質を保てるよう、出力の 2 倍程度の大きさまでに留めておく。
+        img.draft("RGB", (THUMB_WIDTH * 2, THUMB_WIDTH * 2))
+        img.thumbnail((THUMB_WIDTH, THUMB_WIDTH), Image.Resampling.LANCZOS)
+        # 既に RGB なら convert はコピーを作るだけなので呼ばない
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        if THUMB_FORMAT == "webp":
+            rgb.save(dest, format="WEBP", quality=THUMB_QUALITY, method=4)
+        else:
+            rgb.save(dest, format="JPEG", quality=THUMB_QUALITY)
+
+
+def log_image_backend() -> None:
+    """画像サムネイルに使うライブラリを起動時に記録する。Pillow を使う場合は SIMD 版かどうかも見る。"""
+    if pyvips is not None:
+        log("画像サムネイル: pyvips")
+    elif Image is not None:
+        version = Image.__version__
+        # Pillow-SIMD は本家のバージョンに .postN を付けて配布されている
+        if ".post" in version:
+            log(f"画像サムネイル: Pillow-SIMD {version}")
+        else:
+            log(f"画像サムネイル: Pillow {version}（縮小を速くするには pyvips か pillow-simd の導入を検討してください）")
+    else:
+        log("画像サムネイル: Pillow がないため元画像をそのままコピーします")
+
+
+log_image_backend()
 
 
 def run_ffmpeg(args: List[str]) -> bool:
@@ -222,17 +526,99 @@ def run_ffmpeg(args: List[str]) -> bool:
         return False
 
 
+def resolve_ffmpeg_hwaccel(name: str) -> List[str]:
+    """ffmpeg -hwaccels で name が使えるかを起動時に一度だけ確かめ、入力側に付ける引数を返す。
+
+    -hwaccel_output_format は指定しないので、デコードしたフレームは ffmpeg がシステムメモリへ
+    戻してから scale / エンコードに渡す（フィルタやコーデックの指定はソフトウェア時と同じでよい）。
+    """
+    if not name:
+        return []
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-hwaccels"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            timeout=10,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as exc:
+        log(f"ffmpeg のハードウェアデコード対応を確認できませんでした: {exc}")
+        return []
+    # 1 行目は見出し（Hardware acceleration methods:）なので読み飛ばす
+    available = [line.strip() for line in result.stdout.decode(errors="ignore").splitlines()[1:] if line.strip()]
+    if not available or (name != "auto" and name not in available):
+        log(f"ffmpeg は {name} のハードウェアデコードに対応していません（利用可能: {', '.join(available) or 'なし'}）。")
+        return []
+    log(f"ffmpeg のハードウェアデコードを使用します: {name}")
+    return ["-hwaccel", name]
+
+
+FFMPEG_HWACCEL_ARGS = resolve_ffmpeg_hwaccel(FFMPEG_HWACCEL)
+# cuda (NVDEC) のときは縮小も GPU 上の scale_cuda で行い、縮小後のフレームだけをメモリへ戻す
+FFMPEG_CUDA_SCALE = FFMPEG_HWACCEL_ARGS == ["-hwaccel", "cuda"]
+
+
+def resolve_thumb_format(name: str) -> str:
+    """webp のときは ffmpeg -encoders で libwebp があるかを起動時に一度だけ確かめ、なければ jpg を返す。
+
+    libwebp のない ffmpeg では動画のサムネイル生成がすべて失敗し、空ファイルが残って以後スキップされてしまう。
+    """
+    if name != "webp":
+        return name
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-encoders"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            timeout=10,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as exc:
+        log(f"ffmpeg のエンコーダーを確認できませんでした: {exc}")
+        return name
+    # 各行は「 V....D libwebp  libvpx WebP image (codec webp)」の形で、2 列目がエンコーダー名
+    encoders = {line.split()[1] for line in result.stdout.decode(errors="ignore").splitlines() if len(line.split()) > 1}
+    if "libwebp" not in encoders:
+        log("ffmpeg に libwebp エンコーダーがないため、サムネイル・プレビューを jpg で保存します。")
+        return "jpg"
+    return name
+
+
+THUMB_FORMAT = resolve_thumb_format(THUMB_FORMAT)
+THUMB_QUALITY = 80 if THUMB_FORMAT == "webp" else 85
+FFMPEG_THUMB_CODEC_ARGS = ["-c:v", "libwebp", "-quality", str(THUMB_QUALITY)] if THUMB_FORMAT == "webp" else []
+
+
+def _probe_duration_with_av(path: Path) -> Optional[float]:
+    try:
+        # 長さだけ分かればよいので、壊れたタグなどのメタデータの文字コードエラーは無視する
+        with av.open(str(path), metadata_errors="ignore") as container:
+            if container.duration is None:
+                return None
+            return max(float(container.duration) / av.time_base, 0.0)
+    except Exception as exc:  # noqa: BLE001
+        log(f"PyAV で長さ取得に失敗: {exc}")
+        return None
+
+
 def probe_video_duration(path: Path) -> Optional[float]:
+    # PyAV があればプロセスを起動せずにコンテナを直接開く。取れなければ ffprobe に回す。
+    if av is not None:
+        duration = _probe_duration_with_av(path)
+        if duration is not None:
+            return duration
     try:
+        # ストリーム情報や JSON は使わないので format の duration だけを値のみで出力させる
         result = subprocess.run(
             [
                 FFPROBE_BINARY,
                 "-v",
                 "quiet",
-                "-print_format",
-                "json",
-                "-show_format",
-                "-show_streams",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
                 str(path),
             ],
             stdout=subprocess.PIPE,
@@ -240,10 +626,8 @@ def probe_video_duration(path: Path) -> Optional[float]:
             check=True,
             timeout=30,
         )
-        payload = json.loads(result.stdout.decode() or "{}")
-        fmt = payload.get("format", {})
-        raw = fmt.get("duration")
-        if raw is None:
+        raw = result.stdout.decode().strip()
+        if not raw or raw == "N/A":
             return None
         return max(float(raw), 0.0)
     except Exception as exc:  # noqa: BLE001
@@ -252,7 +636,6 @@ def probe_video_duration(path: Path) -> Optional[float]:
 
 
 def get_video_duration(media_hash: str, path: Path) -> Optional[float]:
-    global VIDEO_INFO_DIRTY
     with VIDEO_INFO_LOCK:
         cached = VIDEO_INFO_CACHE.get(media_hash)
         if cached and "duration" in cached:
@@ -261,26 +644,54 @@ def get_video_duration(media_hash: str, path: Path) -> Optional[float]:
     if duration is not None:
         with VIDEO_INFO_LOCK:
             VIDEO_INFO_CACHE[media_hash] = {"duration": duration}
-            VIDEO_INFO_DIRTY = True
+            VIDEO_INFO_DIRTY.add(media_hash)
     return duration
 
 
-def generate_video_thumbnail(src: Path, dest: Path, offset: float) -> bool:
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    return run_ffmpeg(
-        [
-            "-y",
-            "-ss",
-            str(max(offset, 0.0)),
-            "-i",
-            str(src),
-            "-frames:v",
-            "1",
-            "-vf",
-            f"scale={THUMB_WIDTH}:-1",
-            str(dest),
+def video_frame_args(src: Path, offsets: List[float], temp_paths: List[Path], hardware: bool) -> List[str]:
+    args: List[str] = ["-y"]
+    input_args = ["-an"]
+    scale = f"scale={THUMB_WIDTH}:-1"
+    if hardware:
+        input_args += FFMPEG_HWACCEL_ARGS
+        if FFMPEG_CUDA_SCALE:
+            input_args += ["-hwaccel_output_format", "cuda"]
+            scale = f"scale_cuda={THUMB_WIDTH}:-2,hwdownload,format=nv12"
+    for offset in offsets:
+        # -an を入力側に付け、音声ストリームは読み捨てさせる（デコード対象にしない）
+        args += ["-ss", str(max(offset, 0.0)), *input_args, "-i", str(src)]
+    for index, temp_path in enumerate(temp_paths):
+        args += [
+            "-map", f"{index}:v:0", "-frames:v", "1", "-vf", scale,
+            *FFMPEG_THUMB_CODEC_ARGS, str(temp_path),
         ]
-    )
+    return args
+
+
+def generate_video_frames(src: Path, offsets: List[float], dests: List[Path]) -> None:
+    """1 回の ffmpeg 起動で、offsets の各位置から 1 フレームずつ dests に書き出す。
+
+    オフセットごとに入力側シーク（-ss を -i の前に置く）した入力を開き、それぞれを別の出力へ
+    マップする。一時ファイルへ書いてからリネームするので、不完全な画像が残ることはない。
+    フレームが得られなかった出力は空ファイルにして、次回以降の生成をスキップさせる。
+    """
+    for parent in {dest.parent for dest in dests}:
+        parent.mkdir(parents=True, exist_ok=True)
+    temp_paths = [dest.with_name(f"{dest.stem}.tmp{dest.suffix}") for dest in dests]
+    if not run_ffmpeg(video_frame_args(src, offsets, temp_paths, hardware=bool(FFMPEG_HWACCEL_ARGS))) \
+            and FFMPEG_HWACCEL_ARGS:
+        log(f"ハードウェアデコードでのフレーム抽出に失敗したため CPU で再試行します: {src}")
+        run_ffmpeg(video_frame_args(src, offsets, temp_paths, hardware=False))
+    for temp_path, dest in zip(temp_paths, dests):
+        try:
+            written = temp_path.stat().st_size > 0
+        except FileNotFoundError:
+            written = False
+        if written:
+            temp_path.replace(dest)
+        else:
+            temp_path.unlink(missing_ok=True)
+            dest.write_bytes(b"")
 
 
 def compute_thumbnail_offset(duration: Optional[float]) -> float:
@@ -305,85 +716,191 @@ def compute_preview_offsets(duration: Optional[float]) -> List[float]:
 
 
 def ensure_thumbnails(path: Path, media_hash: str, is_video: bool, duration: Optional[float]) -> Dict[str, List[str]]:
-    thumb_name = f"{media_hash}.jpg"
+    thumb_name = f"{media_hash}.{THUMB_FORMAT}"
     thumb_path = THUMB_DIR / thumb_name
     preview_names: List[str] = []
 
-    if not thumb_path.exists():
-        if is_video:
-            offset = compute_thumbnail_offset(duration)
-            if not generate_video_thumbnail(path, thumb_path, offset):
-                thumb_path.write_bytes(b"")
-        else:
+    if not is_video:
+        if not thumb_path.exists():
             generate_image_thumbnail(path, thumb_path)
+        return {"thumbnail": thumb_name, "previews": preview_names}
 
-    if is_video:
-        for index, offset in enumerate(compute_preview_offsets(duration)):
-            preview_name = f"{media_hash}_{index}.jpg"
-            preview_path = PREVIEW_DIR / preview_name
-            preview_names.append(preview_name)
-            if preview_path.exists():
-                continue
-            if not generate_video_thumbnail(path, preview_path, offset):
-                preview_path.write_bytes(b"")
+    # 動画はサムネイルと足りないプレビューをまとめて 1 回の ffmpeg で書き出す。
+    # 生成済みの動画（再走査のほとんど）ではオフセット計算自体を行わない
+    frame_offsets: List[float] = []
+    frame_dests: List[Path] = []
+    if not thumb_path.exists():
+        frame_offsets.append(compute_thumbnail_offset(duration))
+        frame_dests.append(thumb_path)
+    preview_names = [f"{media_hash}_{index}.{THUMB_FORMAT}" for index in range(VIDEO_PREVIEW_COUNT)]
+    missing = [index for index, name in enumerate(preview_names) if not (PREVIEW_DIR / name).exists()]
+    if missing:
+        offsets = compute_preview_offsets(duration)
+        frame_offsets += [offsets[index] for index in missing]
+        frame_dests += [PREVIEW_DIR / preview_names[index] for index in missing]
+    if frame_dests:
+        generate_video_frames(path, frame_offsets, frame_dests)
 
     return {"thumbnail": thumb_name, "previews": preview_names}
 
 
-def fetch_ratings() -> Dict[str, int]:
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("SELECT hash, score FROM ratings").fetchall()
-        return {row[0]: row[1] for row in rows}
+# 直前に問い合わせたハッシュの集合と、そのうち ratings に行があったものの値
+METADATA_CACHE: Optional[Tuple[Set[str], Dict[str, Dict]]] = None
+
+
+def fetch_metadata(hashes: Set[str]) -> Dict[str, Dict]:
+    """hashes の評価・再生回数・登録日をハッシュごとに返す（ratings に行がないハッシュは含まない）。
+
+    テーブル全体ではなく、一時テーブルに入れた今回のハッシュと ratings の JOIN で必要な行だけを読む。
+    書き込みがあるまでは、前回問い合わせた範囲に収まる限りメモリ上の結果を使い回す。
+    """
+    global METADATA_CACHE
+    with DB_LOCK:
+        if METADATA_CACHE is not None and hashes <= METADATA_CACHE[0]:
+            return METADATA_CACHE[1]
+        DB.execute("CREATE TEMP TABLE IF NOT EXISTS scan_hashes(hash TEXT PRIMARY KEY)")
+        DB.execute("BEGIN")
+        try:
+            DB.execute("DELETE FROM scan_hashes")
+            DB.executemany("INSERT INTO scan_hashes(hash) VALUES(?)", [(media_hash,) for media_hash in hashes])
+            rows = DB.execute(
+                """
+                SELECT r.hash, r.score, r.play_count, r.created_at
+                FROM scan_hashes AS s JOIN ratings AS r ON r.hash = s.hash
+                """
+            ).fetchall()
+        except Exception:
+            DB.execute("ROLLBACK")
+            raise
+        DB.execute("COMMIT")
+        metadata = {row[0]: {"score": row[1], "play_count": row[2], "created_at": row[3]} for row in rows}
+        METADATA_CACHE = (set(hashes), metadata)
+        return metadata
+
+
+def invalidate_metadata_cache() -> None:
+    """DB_LOCK を保持した状態で呼び出すこと。"""
+    global METADATA_CACHE
+    METADATA_CACHE = None
+
+
+# 評価・再生回数の加算はキューに積み、書き込みスレッドが COUNTER_BATCH_WINDOW 秒分をまとめて
+# 1 トランザクションでコミットする（クリックが続いてもコミットの回数はバッチ数で済む）。
+COUNTER_BATCH_WINDOW = 0.05
+COUNTER_QUEUE: "queue.Queue[Tuple[str, int, int, Future]]" = queue.Queue()
+
+
+def apply_counter_batch(batch: List[Tuple[str, int, int, Future]]) -> None:
+    try:
+        _apply_counter_batch(batch)
+    finally:
+        for _ in batch:
+            COUNTER_QUEUE.task_done()
+
+
+def _apply_counter_batch(batch: List[Tuple[str, int, int, Future]]) -> None:
+    now = time.time()
+    results: List[Tuple[int, int]] = []
+    try:
+        with DB_LOCK:
+            DB.execute("BEGIN IMMEDIATE")
+            try:
+                for media_hash, score_delta, play_delta, _ in batch:
+                    # RETURNING の結果は fetchall で読み切り、文を完了させてから次へ進む
+                    rows = DB.execute(
+                        """
+                        INSERT INTO ratings(hash, score, play_count, created_at, updated_at) VALUES(?, ?, ?, ?, ?)
+                        ON CONFLICT(hash) DO UPDATE SET
+                            score=score+excluded.score,
+                            play_count=play_count+excluded.play_count,
+                            updated_at=excluded.updated_at
+                        RETURNING score, play_count
+                        """,
+                        (media_hash, score_delta, play_delta, now, now),
+                    ).fetchall()
+                    results.append(rows[0])
+            except Exception:
+                DB.execute("ROLLBACK")
+                raise
+            DB.execute("COMMIT")
+            invalidate_metadata_cache()
+    except Exception as exc:  # noqa: BLE001
+        log(f"評価・再生回数の書き込みに失敗: {exc}")
+        for *_, future in batch:
+            future.set_exception(exc)
+        return
+    for (*_, future), result in zip(batch, results):
+        future.set_result(result)
+
+
+def counter_writer() -> None:
+    while True:
+        batch = [COUNTER_QUEUE.get()]
+        deadline = time.monotonic() + COUNTER_BATCH_WINDOW
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(COUNTER_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        apply_counter_batch(batch)
+
+
+def flush_counter_queue() -> None:
+    """終了時に、まだ書き込みスレッドに拾われていない加算を反映する。"""
+    batch = []
+    while True:
+        try:
+            batch.append(COUNTER_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        apply_counter_batch(batch)
+
+
+def submit_counters(updates: List[Tuple[str, int, int]]) -> List[Tuple[int, int]]:
+    """加算をまとめてキューに積み、それぞれのコミット後の (score, play_count) を返す。"""
+    futures: List[Future] = []
+    for media_hash, score_delta, play_delta in updates:
+        future: Future = Future()
+        COUNTER_QUEUE.put((media_hash, score_delta, play_delta, future))
+        futures.append(future)
+    return [future.result() for future in futures]
+
 
+def submit_counter(media_hash: str, score_delta: int, play_delta: int) -> Tuple[int, int]:
+    return submit_counters([(media_hash, score_delta, play_delta)])[0]
 
-def fetch_metadata() -> Dict[str, Dict]:
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("SELECT hash, score, play_count, created_at FROM ratings").fetchall()
-        return {row[0]: {"score": row[1], "play_count": row[2], "created_at": row[3]} for row in rows}
+
+def queue_counter(media_hash: str, score_delta: int, play_delta: int) -> None:
+    """加算をキューに積むだけで、コミットを待たずに戻る。失敗は書き込みスレッドがログに残す。"""
+    COUNTER_QUEUE.put((media_hash, score_delta, play_delta, Future()))
 
 
 def update_rating(media_hash: str, delta: int) -> int:
-    import time
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute("SELECT score FROM ratings WHERE hash=?", (media_hash,))
-        hit = cursor.fetchone()
-        if hit:
-            score = hit[0] + delta
-            conn.execute(
-                "UPDATE ratings SET score=?, updated_at=? WHERE hash=?",
-                (score, time.time(), media_hash),
-            )
-        else:
-            score = delta
-            now = time.time()
-            conn.execute(
-                "INSERT INTO ratings(hash, score, created_at, updated_at) VALUES(?, ?, ?, ?)",
-                (media_hash, score, now, now),
-            )
-        conn.commit()
-    return score
+    return submit_counter(media_hash, delta, 0)[0]
 
 
 def increment_play_count(media_hash: str) -> int:
-    import time
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute("SELECT play_count FROM ratings WHERE hash=?", (media_hash,))
-        hit = cursor.fetchone()
-        if hit:
-            count = hit[0] + 1
-            conn.execute(
-                "UPDATE ratings SET play_count=?, updated_at=? WHERE hash=?",
-                (count, time.time(), media_hash),
-            )
-        else:
-            count = 1
-            now = time.time()
-            conn.execute(
-                "INSERT INTO ratings(hash, play_count, created_at, updated_at) VALUES(?, ?, ?, ?)",
-                (media_hash, count, now, now),
-            )
-        conn.commit()
-    return count
+    return submit_counter(media_hash, 0, 1)[1]
+
+
+threading.Thread(target=counter_writer, name="counter-writer", daemon=True).start()
+
+
+def record_created_at(rows: List[Tuple[str, float]]) -> None:
+    """新規ファイルの created_at を 1 トランザクションでまとめて登録する。"""
+    if not rows:
+        return
+    execute_batch(
+        """
+        INSERT INTO ratings(hash, created_at, updated_at) VALUES(?, ?, ?)
+        ON CONFLICT(hash) DO UPDATE SET created_at=excluded.created_at, updated_at=excluded.updated_at
+        WHERE ratings.created_at=0
+        """,
+        [(media_hash, created_at, created_at) for media_hash, created_at in rows],
+    )
+    with DB_LOCK:
+        invalidate_metadata_cache()
 
 
 
@@ -402,6 +919,21 @@ def format_duration(seconds: Optional[float]) -> str:
         return f"{mins}:{secs:02d}"
 
 
+def format_bytes(size: int) -> str:
+    if not size:
+        return "0 B"
+    units = ["B", "KB", "MB", "GB", "TB"]
+    value = float(size)
+    idx = 0
+    while value >= 1024 and idx < len(units) - 1:
+        value /= 1024
+        idx += 1
+    return f"{value:.1f} {units[idx]}"
+
+
+NEW_ENTRY_SECONDS = 7 * 24 * 60 * 60
+
+
 @dataclass
 class MediaEntry:
     relative_path: str
@@ -416,130 +948,403 @@ class MediaEntry:
     duration: Optional[float]
     play_count: int = 0
     created_at: Optional[float] = None
+    # 再走査で変更の有無を比べるための更新日時（modified は表示用の秒、こちらはナノ秒の整数）
+    modified_ns: int = 0
+    formatted_duration: str = field(init=False, default="")
+    info_text: str = field(init=False, default="")
+    thumbnail_url: str = field(init=False, default="")
+    preview_urls: List[str] = field(init=False, default_factory=list)
+    view_url: str = field(init=False, default="")
+    media_url: str = field(init=False, default="")
+    _serialized: Optional[Dict[str, object]] = field(init=False, default=None, repr=False, compare=False)
+    # serialize() の dict と、それを JSON にエンコードしたバイト列の組
+    _encoded: Optional[Tuple[Dict[str, object], bytes]] = field(init=False, default=None, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # 長さや URL は走査ごとに固定なので、リクエストごとに url_for せずここで一度だけ作る
+        self.formatted_duration = format_duration(self.duration)
+        # 一覧カードの情報欄（種類 / サイズ / 長さ）もここで組み立てておき、ブラウザ側では整形しない
+        info_parts = [self.media_type, format_bytes(self.size)]
+        if self.media_type == "video" and self.formatted_duration:
+            info_parts.append(self.formatted_duration)
+        self.info_text = " / ".join(info_parts)
+        self.thumbnail_url = f"{THUMB_URL_PREFIX}{quote(self.thumbnail_name)}"
+        self.preview_urls = [f"{PREVIEW_URL_PREFIX}{quote(name)}" for name in self.preview_names]
+        self.view_url = f"{VIEW_URL_PREFIX}{quote(self.relative_path)}"
+        self.media_url = f"{MEDIA_URL_PREFIX}{quote(self.relative_path)}"
+
+    def invalidate_serialized(self) -> None:
+        """評価・再生回数を変えたときに呼び、次の serialize で作り直させる。"""
+        self._serialized = None
 
     def serialize(self) -> Dict[str, object]:
-        import time
+        # 評価・再生回数が変わるまでは前回の結果を使い回す。isNew だけは時間で変わるので、
+        # 新着扱いの間は期限を過ぎていないかを確認する。
+        # serialize は MEDIA_LOCK なしで呼ばれ、組み立て中の投票で古い評価の dict が残ることがあるので、
+        # 使い回す前に評価・再生回数が今の値と一致しているかも確かめる
+        cached = self._serialized
+        if (
+            cached is not None
+            and cached["rating"] == self.rating
+            and cached["playCount"] == self.play_count
+            and not (cached["isNew"] and time.time() - self.created_at >= NEW_ENTRY_SECONDS)
+        ):
+            return cached
+
         # 1週間以内の場合isNewフラグを立てる（閲覧済みかどうかはフロントエンドで判定）
         is_new = False
         if self.created_at:
-            week_in_seconds = 7 * 24 * 60 * 60
-            if (time.time() - self.created_at) < week_in_seconds:
+            if (time.time() - self.created_at) < NEW_ENTRY_SECONDS:
                 is_new = True
         
-        return {
+        # 評価と再生回数は一度だけ読み、ratingText と食い違わないようにする
+        rating = self.rating
+        play_count = self.play_count
+        data = {
             "relativePath": self.relative_path,
             "name": self.name,
             "hash": self.media_hash,
             "type": self.media_type,
             "size": self.size,
             "modified": self.modified,
-            "thumbnailUrl": url_for("serve_thumbnail", filename=self.thumbnail_name),
-            "previewUrls": [
-                url_for("serve_preview", filename=name) for name in self.preview_names
-            ] if self.preview_names else [],
-            "rating": self.rating,
+            "thumbnailUrl": self.thumbnail_url,
+            "previewUrls": self.preview_urls,
+            "rating": rating,
             "duration": self.duration,
-            "formatted_duration": format_duration(self.duration),
-            "playCount": self.play_count,
-            "viewUrl": url_for("view_media", media_path=self.relative_path),
-            "mediaUrl": url_for("serve_media", media_path=self.relative_path),
+            "formatted_duration": self.formatted_duration,
+            "playCount": play_count,
+            "infoText": self.info_text,
+            "ratingText": f"評価: {rating} / 再生: {play_count}回",
+            "viewUrl": self.view_url,
+            "mediaUrl": self.media_url,
             "isNew": is_new,
             "createdAt": self.created_at if self.created_at else 0,
         }
+        self._serialized = data
+        return data
+
+    def encoded(self) -> bytes:
+        """serialize() の JSON バイト列を返す。dict が作り直されるまではエンコード結果を使い回す。"""
+        data = self.serialize()
+        cached = self._encoded
+        if cached is None or cached[0] is not data:
+            cached = self._encoded = (data, encode_json(data))
+        return cached[1]
 
 
 MEDIA_CACHE: List[MediaEntry] = []
 MEDIA_LOOKUP: Dict[str, MediaEntry] = {}
+MEDIA_BY_HASH: Dict[str, List[MediaEntry]] = {}
+MEDIA_TOP_LEVEL: List[MediaEntry] = []
+# 評価の低い順に (評価, 走査順, パス) を並べた索引。sortedcontainers があるときだけ使う
+RATING_INDEX = SortedList() if SortedList is not None else None
+MEDIA_POSITION: Dict[str, int] = {}
 MEDIA_LOCK = threading.Lock()
 SCAN_METADATA: Dict[str, object] = {}
 
+# /api/files・/api/files/stream のエンコード済みレスポンス。条件ごとに保持し、走査・評価・再生で破棄する。
+# isNew は時間経過で変わるので、変更がなくても RESPONSE_CACHE_TTL 秒で作り直す。
+RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE: Dict[Tuple, Tuple[float, bytes]] = {}
+RESPONSE_CACHE_GENERATION = 0
+# ETag はプロセスごとに変わる接頭辞・世代・作成時刻から作り、再起動後に古い ETag が一致しないようにする
+RESPONSE_ETAG_PREFIX = f"{os.getpid():x}-{time.time_ns():x}"
+FILES_STREAM_CHUNK = 200
+
+
+def invalidate_response_cache() -> None:
+    """MEDIA_LOCK を保持した状態で呼び出すこと。"""
+    global RESPONSE_CACHE_GENERATION
+    RESPONSE_CACHE.clear()
+    RESPONSE_CACHE_GENERATION += 1
+
+
+def set_entry_rating(entry: MediaEntry, rating: int) -> None:
+    """MEDIA_LOCK を保持した状態で呼び出すこと。評価の索引も合わせて更新する。"""
+    if RATING_INDEX is not None and entry.rating != rating:
+        position = MEDIA_POSITION[entry.relative_path]
+        RATING_INDEX.remove((entry.rating, position, entry.relative_path))
+        RATING_INDEX.add((rating, position, entry.relative_path))
+    if entry.rating != rating:
+        entry.rating = rating
+        entry.invalidate_serialized()
+
+
+def bump_entry_counters(media_hash: str, score_delta: int, play_delta: int) -> Optional[Tuple[int, int]]:
+    """MEDIA_LOCK を保持した状態で呼び出すこと。
+
+    一覧にあるハッシュなら加算をメモリ上の値へ先に反映して (score, play_count) を返し、DB への加算は
+    書き込みスレッドに任せて待たない（加算なので、後から DB に反映されても同じ値になる）。
+    一覧にないハッシュは None を返すので、呼び出し側でコミット後の値を待つ。
+    """
+    entries = MEDIA_BY_HASH.get(media_hash)
+    if not entries:
+        return None
+    score = entries[0].rating + score_delta
+    play_count = entries[0].play_count + play_delta
+    for entry in entries:
+        set_entry_rating(entry, score)
+        if entry.play_count != play_count:
+            entry.play_count = play_count
+            entry.invalidate_serialized()
+    queue_counter(media_hash, score_delta, play_delta)
+    return score, play_count
+
+
+def resync_entry_counters(hashes: List[str]) -> None:
+    """MEDIA_LOCK を保持した状態で呼び出すこと。
+
+    コミットを待って加算したハッシュが（走査の差し替えなどで）一覧に載っていたら、
+    キューを書き終えてから DB の評価・再生回数を読み直して反映する。
+    """
+    targets = {media_hash: MEDIA_BY_HASH[media_hash] for media_hash in hashes if media_hash in MEDIA_BY_HASH}
+    if not targets:
+        return
+    COUNTER_QUEUE.join()
+    current = fetch_metadata(set(targets))
+    for media_hash, entries in targets.items():
+        counters = current.get(media_hash, {})
+        play_count = counters.get("play_count", 0)
+        for entry in entries:
+            set_entry_rating(entry, counters.get("score", 0))
+            if entry.play_count != play_count:
+                entry.play_count = play_count
+                entry.invalidate_serialized()
+    invalidate_response_cache()
+
+
+def entries_rated_below(threshold: int) -> List[MediaEntry]:
+    """評価が threshold 未満のエントリを走査順で返す。"""
+    with MEDIA_LOCK:
+        if RATING_INDEX is None:
+            return [entry for entry in MEDIA_CACHE if entry.rating < threshold]
+        # 索引の先頭から threshold 未満の範囲だけを取り出し、走査順に並べ直す
+        matches = RATING_INDEX[:RATING_INDEX.bisect_left((threshold,))]
+        return [MEDIA_LOOKUP[path] for _, _, path in sorted(matches, key=lambda item: item[1])]
+
+
+def walk_media_files(directory: Union[str, Path]) -> Iterator[Tuple[Path, os.stat_result, str]]:
+    """directory 以下のメディアファイルを (パス, stat, media_type) で返す。隠しフォルダと _metadata は辿らない。
 
-def iter_media_files() -> List[Path]:
-    entries: List[Path] = []
-    for root, dirs, files in os.walk(APP_ROOT):
-        root_path = Path(root)
-        if METADATA_ROOT in root_path.parents or root_path == METADATA_ROOT:
-            dirs[:] = []
+    再帰中は DirEntry.path の文字列のまま辿り、Path はメディアファイルを返すときにだけ作る。
+    """
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError as exc:
+        log(f"フォルダを読み込めませんでした: {directory} - {exc}")
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
             continue
-            dirs[:] = [
-                d
-                for d in dirs
-                if not d.startswith('.') and d.lower() != '_metadata'
-            ]
-        for filename in files:
-            if filename.startswith("."):
-                continue
-            path = root_path / filename
-            if path.suffix.lower() in MEDIA_EXTENSIONS:
-                entries.append(path)
-    entries.sort()
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name.lower() != "_metadata":
+                yield from walk_media_files(entry.path)
+        elif entry.is_file() and (media_type := EXT_TO_TYPE.get(media_suffix(entry.name))):
+            yield Path(entry.path), entry.stat(), media_type
+
+
+def list_file_names(directory: Path) -> Set[str]:
+    try:
+        return set(os.listdir(directory))
+    except FileNotFoundError:
+        return set()
+
+
+def iter_media_files() -> List[Tuple[Path, os.stat_result, str]]:
+    entries = list(walk_media_files(APP_ROOT))
+    entries.sort(key=lambda item: item[0])
     return entries
 
 
+def plan_hash_batches(files: List[Tuple[Path, os.stat_result]]) -> List[List[Tuple[Path, os.stat_result]]]:
+    """小さいファイルを SMALL_FILE_HASH_BATCH 件ずつまとめ、大きいファイルは 1 件ずつのバッチにする。"""
+    batches: List[List[Tuple[Path, os.stat_result]]] = []
+    small: List[Tuple[Path, os.stat_result]] = []
+    for item in files:
+        if item[1].st_size > SMALL_FILE_HASH_LIMIT:
+            batches.append([item])
+            continue
+        small.append(item)
+        if len(small) == SMALL_FILE_HASH_BATCH:
+            batches.append(small)
+            small = []
+    if small:
+        batches.append(small)
+    return batches
+
+
+def hash_media_batch(batch: List[Tuple[Path, os.stat_result]]) -> List[str]:
+    """バッチ内のファイルのハッシュを返す。キャッシュへの書き戻しはバッチごとに 1 回のロックで済ませる。"""
+    hashes: List[str] = []
+    computed: List[Tuple[str, str, str]] = []
+    for path, stat in batch:
+        cache_key = str(path)
+        signature = hash_signature(stat)
+        cached = HASH_CACHE.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            hashes.append(cached[1])
+            continue
+        file_hash = hash_file_contents(path, stat.st_size)
+        computed.append((cache_key, signature, file_hash))
+        hashes.append(file_hash)
+    if computed:
+        with HASH_CACHE_LOCK:
+            for cache_key, signature, file_hash in computed:
+                HASH_CACHE[cache_key] = (signature, file_hash)
+                HASH_CACHE_DIRTY.add(cache_key)
+    return hashes
+
+
+def prepare_media(path: Path, media_hash: str, is_video: bool) -> Tuple[Optional[float], Dict[str, List[str]]]:
+    duration = get_video_duration(media_hash, path) if is_video else None
+    thumbs = ensure_thumbnails(path, media_hash, is_video, duration)
+    return duration, thumbs
+
+
 def refresh_media_index() -> Dict[str, int]:
     log("メディアファイルを走査しています...")
-    metadata_map = fetch_metadata()
     files = iter_media_files()
     new_entries: List[MediaEntry] = []
 
-    for path in files:
-        media_type = "video" if path.suffix.lower() in VIDEO_EXTENSIONS else "image"
-        media_hash = compute_file_hash(path)
-        relative = path.relative_to(APP_ROOT).as_posix()
-        duration = get_video_duration(media_hash, path) if media_type == "video" else None
-        thumbs = ensure_thumbnails(path, media_hash, media_type == "video", duration)
-        metadata = metadata_map.get(media_hash, {"score": 0, "play_count": 0, "created_at": None})
-        
-        # 新規ファイルの場合、created_atを設定
-        import time
-        created_at = metadata.get("created_at")
-        if created_at is None or created_at == 0:
-            created_at = time.time()
-            # DBに登録
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.execute(
-                    "INSERT OR IGNORE INTO ratings(hash, created_at, updated_at) VALUES(?, ?, ?)",
-                    (media_hash, created_at, created_at),
-                )
-                # 既存レコードの場合はUPDATE
-                conn.execute(
-                    "UPDATE ratings SET created_at=?, updated_at=? WHERE hash=? AND created_at=0",
-                    (created_at, created_at, media_hash),
-                )
-                conn.commit()
-        
-        stat = path.stat()
-        entry = MediaEntry(
-            relative_path=relative,
-            name=path.name,
-            media_hash=media_hash,
-            media_type=media_type,
-            size=stat.st_size,
-            modified=stat.st_mtime,
-            thumbnail_name=thumbs["thumbnail"],
-            preview_names=thumbs["previews"] if media_type == "video" else [],
-            rating=metadata.get("score", 0),
-            duration=duration,
-            play_count=metadata.get("play_count", 0),
-            created_at=created_at,
+    # 前回の走査からパス・サイズ・更新日時が変わっていないファイルは前回のエントリを使い回し、
+    # ハッシュ計算とサムネイル確認を省く（評価・再生回数だけ最新の値に合わせる）
+    with MEDIA_LOCK:
+        previous = dict(MEDIA_LOOKUP)
+    # サムネイル・プレビューが消されていたら使い回さずに作り直す。
+    # ファイルごとに stat せず、フォルダの一覧をそれぞれ 1 回だけ取って確かめる
+    thumb_files = list_file_names(THUMB_DIR) if previous else set()
+    preview_files = list_file_names(PREVIEW_DIR) if previous else set()
+    relatives: Dict[Path, str] = {}
+    video_paths: Set[Path] = set()
+    reused: Dict[Path, MediaEntry] = {}
+    pending: List[Tuple[Path, os.stat_result]] = []
+    for path, stat, media_type in files:
+        relative = relatives[path] = path.relative_to(APP_ROOT).as_posix()
+        if media_type == "video":
+            video_paths.add(path)
+        entry = previous.get(relative)
+        if (
+            entry is not None
+            and entry.size == stat.st_size
+            and entry.modified_ns == stat.st_mtime_ns
+            and entry.thumbnail_name in thumb_files
+            and preview_files.issuperset(entry.preview_names)
+        ):
+            reused[path] = entry
+        else:
+            pending.append((path, stat))
+
+    # ハッシュ計算と ffprobe/ffmpeg を別々のプールで並列に流し、両者を重ねて実行する。
+    # 同一ハッシュのファイルはサムネイルを共有するので、生成ジョブは 1 回だけ投げる。
+    hashes: Dict[Path, str] = {}
+    prepared: Dict[Tuple[str, bool], Future] = {}
+    batches = plan_hash_batches(pending)
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as hash_pool, \
+            ThreadPoolExecutor(max_workers=SCAN_WORKERS) as media_pool:
+        for batch, batch_hashes in zip(batches, hash_pool.map(hash_media_batch, batches)):
+            for (path, _), media_hash in zip(batch, batch_hashes):
+                hashes[path] = media_hash
+                is_video = path in video_paths
+                if (media_hash, is_video) not in prepared:
+                    prepared[(media_hash, is_video)] = media_pool.submit(prepare_media, path, media_hash, is_video)
+        # サムネイル生成を待つ間に、今回見つかったハッシュの評価などを読み込んでおく。
+        # 評価・再生回数の加算はコミットを待たずに返しているので、キューに残っている分を書き終えてから読む。
+        COUNTER_QUEUE.join()
+        metadata_map = fetch_metadata({entry.media_hash for entry in reused.values()} | set(hashes.values()))
+
+    # 索引・トップレベル一覧・件数はエントリ生成と同じ 1 回のループで作り、ロック内では差し替えるだけにする
+    new_created: List[Tuple[str, float]] = []
+    new_lookup: Dict[str, MediaEntry] = {}
+    new_by_hash: Dict[str, List[MediaEntry]] = {}
+    new_top_level: List[MediaEntry] = []
+    video_count = 0
+    for path, stat, media_type in files:
+        is_video = media_type == "video"
+        relative = relatives[path]
+        entry = reused.get(path)
+        metadata = metadata_map.get(
+            entry.media_hash if entry is not None else hashes[path],
+            {"score": 0, "play_count": 0, "created_at": None},
         )
+        if entry is not None:
+            media_hash = entry.media_hash
+            if not metadata.get("created_at"):
+                new_created.append((media_hash, entry.created_at or time.time()))
+        else:
+            media_hash = hashes[path]
+            duration, thumbs = prepared[(media_hash, is_video)].result()
+
+            # 新規ファイルの場合、created_atを設定（DBへはループ後にまとめて登録）
+            created_at = metadata.get("created_at")
+            if created_at is None or created_at == 0:
+                created_at = time.time()
+                new_created.append((media_hash, created_at))
+
+            entry = MediaEntry(
+                relative_path=relative,
+                name=path.name,
+                media_hash=media_hash,
+                media_type=media_type,
+                size=stat.st_size,
+                modified=stat.st_mtime,
+                modified_ns=stat.st_mtime_ns,
+                thumbnail_name=thumbs["thumbnail"],
+                preview_names=thumbs["previews"] if is_video else [],
+                rating=metadata.get("score", 0),
+                duration=duration,
+                play_count=metadata.get("play_count", 0),
+                created_at=created_at,
+            )
         new_entries.append(entry)
+        new_lookup[relative] = entry
+        # 同一ハッシュのファイルは評価を共有するのでリストで持つ
+        new_by_hash.setdefault(media_hash, []).append(entry)
+        if "/" not in relative:
+            new_top_level.append(entry)
+        video_count += is_video
+
+    record_created_at(new_created)
 
     with MEDIA_LOCK:
+        # サムネイル生成を待つ間にも評価・再生回数は加算されるので、metadata_map の値は古いことがある。
+        # MEDIA_LOCK を持っている間は一覧にあるハッシュへの加算はキューに積まれないため、
+        # キューを書き終えてから DB の値を読み直して反映する（加算がなければ fetch_metadata のキャッシュで済む）。
+        COUNTER_QUEUE.join()
+        current = fetch_metadata(set(new_by_hash))
+        for entry in new_entries:
+            counters = current.get(entry.media_hash, {})
+            rating = counters.get("score", 0)
+            play_count = counters.get("play_count", 0)
+            if entry.rating != rating or entry.play_count != play_count:
+                entry.rating = rating
+                entry.play_count = play_count
+                entry.invalidate_serialized()
         MEDIA_CACHE[:] = new_entries
         MEDIA_LOOKUP.clear()
-        for entry in MEDIA_CACHE:
-            MEDIA_LOOKUP[entry.relative_path] = entry
+        MEDIA_LOOKUP.update(new_lookup)
+        MEDIA_BY_HASH.clear()
+        MEDIA_BY_HASH.update(new_by_hash)
+        MEDIA_TOP_LEVEL[:] = new_top_level
+        MEDIA_POSITION.clear()
+        MEDIA_POSITION.update((entry.relative_path, position) for position, entry in enumerate(new_entries))
+        if RATING_INDEX is not None:
+            RATING_INDEX.clear()
+            RATING_INDEX.update(
+                (entry.rating, position, entry.relative_path) for position, entry in enumerate(new_entries)
+            )
         SCAN_METADATA.update(
             {
                 "lastScan": datetime.now().isoformat(),
-                "total": len(MEDIA_CACHE),
-                "videos": sum(1 for e in MEDIA_CACHE if e.media_type == "video"),
-                "images": sum(1 for e in MEDIA_CACHE if e.media_type == "image"),
+                "total": len(new_entries),
+                "videos": video_count,
+                "images": len(new_entries) - video_count,
             }
         )
+        invalidate_response_cache()
 
-    flush_hash_cache()
+    # 走査で見つからなかったパスのキャッシュは残しておいても使われないので、ここで片付ける
+    flush_hash_cache({str(path) for path, _, _ in files})
     flush_video_info_cache()
     log(f"走査完了: {len(new_entries)} 件")
     return {
@@ -553,10 +1358,10 @@ refresh_media_index()
 
 
 app = Flask(__name__)
+app.config["USE_X_SENDFILE"] = USE_X_SENDFILE
 
 
 def _auth_required() -> "flask.Response":
-    from flask import Response
     return Response(
         "認証が必要です",
         401,
@@ -564,6 +1369,13 @@ def _auth_required() -> "flask.Response":
     )
 
 
+def encode_json(payload: object) -> bytes:
+    """orjson があればそれで直接エンコードし、なければ標準の json を使う。"""
+    if orjson is None:
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return orjson.dumps(payload)
+
+
 @app.before_request
 def check_basic_auth():
     """BASIC_AUTH_USERNAME と BASIC_AUTH_PASSWORD が設定されている場合にベーシック認証を行う。"""
@@ -578,32 +1390,64 @@ def check_basic_auth():
         return _auth_required()
 
 
-def filter_entries(include_subfolders: bool, rating_filter: str, rating_value: int = 0, play_count_filter: str = "all") -> List[Dict[str, object]]:
+def filter_entries(include_subfolders: bool, rating_filter: str, rating_value: int = 0, play_count_filter: str = "all") -> List[MediaEntry]:
+    # フォルダ階層は走査ごとに固定なので、ルート直下のみの一覧は走査時に分けておいたものを使う。
+    # 評価・再生回数はクリックで変わるため、指定された条件だけをその場で絞り込む。
     with MEDIA_LOCK:
-        entries = list(MEDIA_CACHE)
-    filtered: List[MediaEntry] = []
-    for entry in entries:
-        if not include_subfolders and "/" in entry.relative_path:
-            continue
-        if rating_filter == "above" and entry.rating < rating_value:
-            continue
-        elif rating_filter == "below" and entry.rating > rating_value:
-            continue
-        if play_count_filter == "zero" and entry.play_count != 0:
-            continue
-        elif play_count_filter == "non_zero" and entry.play_count == 0:
-            continue
-        filtered.append(entry)
-    return [entry.serialize() for entry in filtered]
+        entries = list(MEDIA_CACHE if include_subfolders else MEDIA_TOP_LEVEL)
+    if rating_filter == "above":
+        entries = [entry for entry in entries if entry.rating >= rating_value]
+    elif rating_filter == "below":
+        entries = [entry for entry in entries if entry.rating <= rating_value]
+    if play_count_filter == "zero":
+        entries = [entry for entry in entries if entry.play_count == 0]
+    elif play_count_filter == "non_zero":
+        entries = [entry for entry in entries if entry.play_count != 0]
+    return entries
 
 
-@app.route("/")
-def index() -> str:
-    return render_template_string(INDEX_TEMPLATE, scan_info=SCAN_METADATA)
+def iter_files_payload(entries: List[MediaEntry]) -> Iterator[bytes]:
+    """/api/files の JSON を FILES_STREAM_CHUNK 件ずつエンコードしながら生成する。"""
+    yield b'{"media":['
+    for start in range(0, len(entries), FILES_STREAM_CHUNK):
+        chunk = b",".join(entry.encoded() for entry in entries[start:start + FILES_STREAM_CHUNK])
+        yield chunk if start == 0 else b"," + chunk
+    yield b'],"scan":' + encode_json(SCAN_METADATA) + b"}"
 
 
-@app.route("/api/files")
-def api_files() -> "flask.Response":
+def iter_files_ndjson(entries: List[MediaEntry]) -> Iterator[bytes]:
+    """/api/files/stream 用に 1 行 1 件の NDJSON を生成し、最後の行に走査情報を付ける。"""
+    for start in range(0, len(entries), FILES_STREAM_CHUNK):
+        yield b"\n".join(entry.encoded() for entry in entries[start:start + FILES_STREAM_CHUNK]) + b"\n"
+    yield encode_json({"scan": SCAN_METADATA}) + b"\n"
+
+
+# 並び順はブラウザ側の sortAndRenderMedia と同じ比較にする（同値は走査順のまま）
+SORT_KEYS = {
+    "name": lambda entry: entry.name.lower(),
+    "created": lambda entry: entry.created_at or 0,
+    "rating": lambda entry: entry.rating,
+    "playCount": lambda entry: entry.play_count,
+}
+
+
+def stream_files_payload(parts_iter: Iterator[bytes], key: Tuple, generation: int, started: float) -> Iterator[bytes]:
+    """レスポンスを送りながら組み立て、最後まで送れたらキャッシュに保存する。"""
+    parts: List[bytes] = []
+    for part in parts_iter:
+        parts.append(part)
+        yield part
+    with MEDIA_LOCK:
+        # 組み立て中に評価などが更新されていたら古い内容なので保存しない
+        if generation == RESPONSE_CACHE_GENERATION:
+            RESPONSE_CACHE[key] = (started, b"".join(parts))
+
+
+def response_etag(generation: int, started: float) -> str:
+    return f"{RESPONSE_ETAG_PREFIX}-{generation}-{int(started * 1000):x}"
+
+
+def parse_files_filters() -> Tuple[bool, str, int, str]:
     include_subfolders = request.args.get("includeSubfolders", "true").lower() == "true"
     rating_filter = request.args.get("ratingFilter", "all")
     try:
@@ -612,8 +1456,61 @@ def api_files() -> "flask.Response":
     except (ValueError, TypeError):
         rating_value = 0
     play_count_filter = request.args.get("playCountFilter", "all")
-    data = filter_entries(include_subfolders, rating_filter, rating_value, play_count_filter)
-    return jsonify({"media": data, "scan": SCAN_METADATA})
+    # 未知の値は「全て」と同じ結果になるので、キャッシュキーもそろえておく
+    if rating_filter not in ("above", "below"):
+        rating_filter, rating_value = "all", 0
+    if play_count_filter not in ("zero", "non_zero"):
+        play_count_filter = "all"
+    return include_subfolders, rating_filter, rating_value, play_count_filter
+
+
+def cached_files_response(key: Tuple, mimetype: str, build: Callable[[], Iterator[bytes]]) -> Response:
+    """キャッシュ済みならそれを（ETag が一致すれば 304 を）返し、なければ build() の出力を流しながらキャッシュする。"""
+    now = time.monotonic()
+    with MEDIA_LOCK:
+        cached = RESPONSE_CACHE.get(key)
+        generation = RESPONSE_CACHE_GENERATION
+    if cached is not None and now - cached[0] < RESPONSE_CACHE_TTL:
+        etag = response_etag(generation, cached[0])
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(cached[1], mimetype=mimetype)
+        response.set_etag(etag)
+        return response
+    # キャッシュがなければ、全件のリストを作らずにエンコードしながら返す
+    response = Response(stream_files_payload(build(), key, generation, now), mimetype=mimetype)
+    response.set_etag(response_etag(generation, now))
+    return response
+
+
+@app.route("/")
+def index() -> str:
+    return INDEX_HTML
+
+
+@app.route("/api/files")
+def api_files() -> "flask.Response":
+    filters = parse_files_filters()
+    return cached_files_response(
+        filters, "application/json", lambda: iter_files_payload(filter_entries(*filters))
+    )
+
+
+@app.route("/api/files/stream")
+def api_files_stream() -> Response:
+    """/api/files と同じ内容を並べ替え済みの NDJSON で返し、ブラウザが届いた分から描画できるようにする。"""
+    filters = parse_files_filters()
+    sort_by = request.args.get("sortBy", "name")
+    if sort_by not in SORT_KEYS:
+        sort_by = "name"
+    descending = request.args.get("sortOrder", "asc") == "desc"
+
+    def build() -> Iterator[bytes]:
+        entries = sorted(filter_entries(*filters), key=SORT_KEYS[sort_by], reverse=descending)
+        return iter_files_ndjson(entries)
+
+    return cached_files_response((*filters, sort_by, descending), "application/x-ndjson", build)
 
 
 @app.route("/api/refresh", methods=["POST"])
@@ -629,25 +1526,64 @@ def api_rate() -> "flask.Response":
     delta = int(payload.get("delta", 0))
     if media_hash is None or delta not in (1, -1):
         abort(400, "hash と delta (±1) が必要です")
+    with MEDIA_LOCK:
+        counters = bump_entry_counters(media_hash, delta, 0)
+        if counters is not None:
+            invalidate_response_cache()
+    if counters is not None:
+        return jsonify({"hash": media_hash, "rating": counters[0]})
     new_score = update_rating(media_hash, delta)
     with MEDIA_LOCK:
-        for entry in MEDIA_CACHE:
-            if entry.media_hash == media_hash:
-                entry.rating = new_score
+        resync_entry_counters([media_hash])
     return jsonify({"hash": media_hash, "rating": new_score})
 
 
+@app.route("/api/rate-batch", methods=["POST"])
+def api_rate_batch() -> Response:
+    payload = request.get_json(force=True)
+    votes = payload.get("votes")
+    if not isinstance(votes, list):
+        abort(400, "votes が必要です")
+    # 同じハッシュへの投票は合算して 1 回の加算にする
+    deltas: Dict[str, int] = {}
+    for vote in votes:
+        media_hash = vote.get("hash") if isinstance(vote, dict) else None
+        delta = int(vote.get("delta", 0)) if media_hash is not None else 0
+        if media_hash is None or delta not in (1, -1):
+            abort(400, "各 vote に hash と delta (±1) が必要です")
+        deltas[media_hash] = deltas.get(media_hash, 0) + delta
+    ratings: Dict[str, int] = {}
+    with MEDIA_LOCK:
+        for media_hash, delta in deltas.items():
+            counters = bump_entry_counters(media_hash, delta, 0)
+            if counters is not None:
+                ratings[media_hash] = counters[0]
+        if ratings:
+            invalidate_response_cache()
+    unknown = [(media_hash, delta, 0) for media_hash, delta in deltas.items() if media_hash not in ratings]
+    if unknown:
+        for (media_hash, _, _), (score, _) in zip(unknown, submit_counters(unknown)):
+            ratings[media_hash] = score
+        with MEDIA_LOCK:
+            resync_entry_counters([media_hash for media_hash, _, _ in unknown])
+    return jsonify({"ratings": ratings})
+
+
 @app.route("/api/play", methods=["POST"])
 def api_play() -> "flask.Response":
     payload = request.get_json(force=True)
     media_hash = payload.get("hash")
     if media_hash is None:
         abort(400, "hash が必要です")
+    with MEDIA_LOCK:
+        counters = bump_entry_counters(media_hash, 0, 1)
+        if counters is not None:
+            invalidate_response_cache()
+    if counters is not None:
+        return jsonify({"hash": media_hash, "playCount": counters[1]})
     new_count = increment_play_count(media_hash)
     with MEDIA_LOCK:
-        for entry in MEDIA_CACHE:
-            if entry.media_hash == media_hash:
-                entry.play_count = new_count
+        resync_entry_counters([media_hash])
     return jsonify({"hash": media_hash, "playCount": new_count})
 
 
@@ -657,8 +1593,7 @@ def api_play() -> "flask.Response":
 @app.route("/api/low-rated")
 def api_low_rated() -> "flask.Response":
     threshold = int(request.args.get("threshold", 0))
-    with MEDIA_LOCK:
-        paths = [entry.relative_path for entry in MEDIA_CACHE if entry.rating < threshold]
+    paths = [entry.relative_path for entry in entries_rated_below(threshold)]
     return jsonify({"count": len(paths), "paths": paths})
 
 
@@ -670,8 +1605,7 @@ def api_move_negative() -> "flask.Response":
     moved_files: List[str] = []
     failed_files: List[str] = []
     
-    with MEDIA_LOCK:
-        negative_entries = [entry for entry in MEDIA_CACHE if entry.rating < 0]
+    negative_entries = entries_rated_below(0)
     
     for entry in negative_entries:
         src_path = APP_ROOT / entry.relative_path
@@ -704,33 +1638,41 @@ def api_move_negative() -> "flask.Response":
     })
 
 
-@app.route("/thumbnails/<path:filename>")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def send_immutable(directory: Path, filename: str) -> Response:
+    """ファイル名にハッシュを含み内容が変わらないファイルを、ブラウザに再検証させずにキャッシュさせる。"""
+    response = send_from_directory(directory, filename)
+    # 生成に失敗したときの空ファイルは、削除すれば同じ URL で作り直されるので no-cache のままにする
+    if response.content_length:
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return response
+
+
+@app.route(f"{THUMB_URL_PREFIX}<path:filename>")
 def serve_thumbnail(filename: str):
-    return send_from_directory(THUMB_DIR, filename)
+    return send_immutable(THUMB_DIR, filename)
 
 
-@app.route("/previews/<path:filename>")
+@app.route(f"{PREVIEW_URL_PREFIX}<path:filename>")
 def serve_preview(filename: str):
-    return send_from_directory(PREVIEW_DIR, filename)
+    return send_immutable(PREVIEW_DIR, filename)
 
 
-@app.route("/media/<path:media_path>")
+@app.route(f"{MEDIA_URL_PREFIX}<path:media_path>")
 def serve_media(media_path: str):
-    safe_path = safe_join(str(APP_ROOT), media_path)
-    if safe_path is None or not Path(safe_path).exists():
-        abort(404)
-    directory = str(Path(safe_path).parent)
-    filename = Path(safe_path).name
-    return send_from_directory(directory, filename)
+    # パスの検証と存在確認（なければ 404）は send_from_directory に任せ、同じファイルを何度も stat しない
+    return send_from_directory(APP_ROOT, media_path)
 
 
-@app.route("/view/<path:media_path>")
+@app.route(f"{VIEW_URL_PREFIX}<path:media_path>")
 def view_media(media_path: str):
     with MEDIA_LOCK:
         entry = MEDIA_LOOKUP.get(media_path)
     if not entry:
         abort(404)
-    return render_template_string(VIEW_TEMPLATE, entry=entry.serialize())
+    return VIEW_PAGE_TEMPLATE.render(entry=entry.serialize())
 
 
 INDEX_TEMPLATE = """
@@ -782,6 +1724,16 @@ INDEX_TEMPLATE = """
             gap: 0.5rem;
             box-shadow: 0 6px 12px rgba(0,0,0,0.35);
         }
+        /* 画面外のカードはレイアウト・描画を省略させる（仮想化中は描画範囲を JS で絞るので不要） */
+        .grid:not(.virtual) .card {
+            content-visibility: auto;
+            contain-intrinsic-size: auto 220px auto 270px;
+        }
+        .grid.virtual .meta .title {
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
+        }
         .card.unplayed {
             background: #3a4a5f;
         }
@@ -927,7 +1879,8 @@ INDEX_TEMPLATE = """
     <template id=\"cardTemplate\">
         <article class=\"card\">
             <div class=\"thumb-wrapper\">
-                <img loading=\"lazy\">
+                <img loading=\"lazy\" decoding=\"async\">
+                <div class=\"new-badge\" hidden>NEW</div>
             </div>
             <div class=\"meta\">
                 <strong class=\"title\"></strong>
@@ -956,48 +1909,123 @@ INDEX_TEMPLATE = """
         const lowRatedOutput = document.getElementById('lowRatedOutput');
         const scanInfo = document.getElementById('scanInfo');
         const anchors = document.getElementById('anchors');
-        const hoverTimers = new WeakMap();
+        // ホバー中のプレビューは 1 本の requestAnimationFrame ループでまとめて切り替える
+        const hoverState = new Map();
+        const HOVER_INTERVAL_MS = 500;
+        let hoverFrame = null;
+        // 画面内にあるカード（IntersectionObserver で追跡）
+        const visibleCards = new WeakSet();
+        const cardVisibilityObserver = 'IntersectionObserver' in window
+            ? new IntersectionObserver((entries) => {
+                entries.forEach((entry) => {
+                    if (entry.isIntersecting) visibleCards.add(entry.target);
+                    else visibleCards.delete(entry.target);
+                });
+            })
+            : null;
+        // 再描画のたびにカードを作り直さず、このプールのノードを使い回す
+        const cardPool = [];
+        const anchorPool = [];
+        let pendingRender = null;
+        let renderFull = false;
+        let viewedItemsCache = new Set();
+        const VIRTUALIZE_THRESHOLD = 1000;
+        const OVERSCAN_ROWS = 4;
+        const ROW_BATCH = 10;
+        const DEFAULT_ROW_HEIGHT = 320;
+        let rowHeight = 0;
+        let virtualRange = null;
         let currentMediaData = [];
         let currentSortedData = [];
-
-        const formatBytes = (bytes) => {
-            if (!bytes) return '0 B';
-            const units = ['B','KB','MB','GB','TB'];
-            let idx = 0;
-            let value = bytes;
-            while (value >= 1024 && idx < units.length - 1) {
-                value /= 1024;
-                idx++;
-            }
-            return `${value.toFixed(1)} ${units[idx]}`;
-        };
-
-        const formatDuration = (seconds) => {
-            if (typeof seconds !== 'number' || !Number.isFinite(seconds) || seconds <= 0) {
-                return '';
-            }
-            const total = Math.floor(seconds);
-            const hrs = Math.floor(total / 3600);
-            const mins = Math.floor((total % 3600) / 60);
-            const secs = total % 60;
-            const pad = (value) => value.toString().padStart(2, '0');
-            return hrs > 0 ? `${hrs}:${pad(mins)}:${pad(secs)}` : `${mins}:${pad(secs)}`;
-        };
-
+        const LOAD_DEBOUNCE_MS = 200;
+        let loadDebounceTimer = null;
+        let loadController = null;
+        const MEDIA_CACHE_THROTTLE_MS = 300;
+        const mediaResponseCache = new Map();
+        const VOTE_BATCH_MS = 75;
+        const pendingVotes = [];
+        let voteFlushTimer = null;
+
+        // 新しい読み込みを始めるときは前のリクエストを中断し、古い応答で表示が上書きされないようにする
         async function loadMedia() {
+            if (loadController) loadController.abort();
+            const controller = new AbortController();
+            loadController = controller;
             const params = new URLSearchParams({
                 includeSubfolders: includeSubfolders.checked,
                 ratingFilter: ratingFilter.value,
                 ratingValue: ratingValue.value,
                 playCountFilter: playCountFilter.value,
+                sortBy: sortBy.value,
+                sortOrder: sortOrder.value,
             });
-            const response = await fetch(`/api/files?${params}`);
-            const data = await response.json();
+            // 同じ条件の結果は ETag 付きで保持し、直近 MEDIA_CACHE_THROTTLE_MS 以内ならリクエストせず使う。
+            // それより古ければ If-None-Match で問い合わせ、304 なら手元の結果をそのまま描画する
+            const key = params.toString();
+            const cached = mediaResponseCache.get(key);
+            let data;
+            try {
+                if (cached && performance.now() - cached.fetchedAt < MEDIA_CACHE_THROTTLE_MS) {
+                    data = cached.data;
+                } else {
+                    const headers = cached && cached.etag ? {'If-None-Match': cached.etag} : {};
+                    const response = await fetch(`/api/files/stream?${params}`, {signal: controller.signal, headers});
+                    if (response.status === 304 && cached) {
+                        cached.fetchedAt = performance.now();
+                        data = cached.data;
+                    } else {
+                        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                        data = await readMediaStream(response, controller);
+                        if (data === null) return;
+                        mediaResponseCache.set(key, {etag: response.headers.get('ETag'), data, fetchedAt: performance.now()});
+                    }
+                }
+            } catch (err) {
+                if (err.name === 'AbortError' || loadController !== controller) return;
+                // 途中まで届いた行はもう描画されているので、読み込み前の一覧を描き直して元に戻す
+                loadController = null;
+                sortAndRenderMedia();
+                console.error('一覧の読み込みに失敗:', err);
+                alert('一覧の読み込みに失敗しました');
+                return;
+            }
+            if (loadController !== controller) return;
+            loadController = null;
             currentMediaData = data.media;
             sortAndRenderMedia();
             renderScanInfo(data.scan);
         }
 
+        // /api/files/stream は並べ替え済みの NDJSON なので、全件を待たずに届いた行から描画していく
+        async function readMediaStream(response, controller) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const media = [];
+            let scan = null;
+            let buffer = '';
+            viewedItemsCache = loadViewedItems();
+            while (true) {
+                const {done, value} = await reader.read();
+                if (loadController !== controller) {
+                    reader.cancel();
+                    return null;
+                }
+                buffer += decoder.decode(value || new Uint8Array(), {stream: !done});
+                const lines = buffer.split('\\n');
+                buffer = done ? '' : lines.pop();
+                for (const line of lines) {
+                    if (!line) continue;
+                    const record = JSON.parse(line);
+                    if (record.scan) scan = record.scan;
+                    else media.push(record);
+                }
+                if (done) break;
+                currentSortedData = media;
+                scheduleRender();
+            }
+            return {media, scan};
+        }
+
         function sortAndRenderMedia() {
             const sortByValue = sortBy.value;
             const sortOrderValue = sortOrder.value;
@@ -1043,128 +2071,340 @@ INDEX_TEMPLATE = """
             scanInfo.textContent = `最終更新: ${info.lastScan || '-'} / ファイル総数: ${info.total || 0} (動画 ${info.videos || 0}, 画像 ${info.images || 0})`;
         }
 
+        // 表示用の文字列はサーバーが infoText/ratingText として用意する。評価を変えたときだけここで作り直す
+        const ratingText = (item) => `評価: ${item.rating} / 再生: ${item.playCount}回`;
+
+        function loadViewedItems() {
+            try {
+                return new Set(JSON.parse(localStorage.getItem('viewedMediaItems') || '[]'));
+            } catch (err) {
+                return new Set();
+            }
+        }
+
+        // loading="lazy" に対応していないブラウザでは IntersectionObserver で表示直前に src を入れる。
+        // オブザーバーは画像ごとに作らず、全サムネイルでこの 1 つを共有する
+        const lazyObserver = 'loading' in HTMLImageElement.prototype || !('IntersectionObserver' in window)
+            ? null
+            : new IntersectionObserver((entries) => {
+                entries.forEach((entry) => {
+                    if (!entry.isIntersecting) return;
+                    const img = entry.target;
+                    lazyObserver.unobserve(img);
+                    const url = img._card._item && img._card._item.thumbnailUrl;
+                    if (url && img.getAttribute('src') !== url) img.src = url;
+                });
+            }, {rootMargin: '300px'});
+
+        function createCard(index, fragment) {
+            // 20 件ごとのアンカーはカードの直前に置き、カードと一緒にプールする
+            if (index > 0 && index % 20 === 0) {
+                const anchorIndex = index / 20;
+                const anchor = document.createElement('div');
+                anchor.id = `anchor-${anchorIndex}`;
+                anchor.innerHTML = `<a href="#top">TOPに戻る</a>`;
+                fragment.appendChild(anchor);
+                anchorPool.push(anchor);
+            }
+            const card = cardTemplate.content.firstElementChild.cloneNode(true);
+            card._refs = {
+                img: card.querySelector('img'),
+                badge: card.querySelector('.new-badge'),
+                title: card.querySelector('.title'),
+                info: card.querySelector('.info'),
+                rating: card.querySelector('.rating'),
+                viewLink: card.querySelector('.view-link'),
+            };
+            // 項目データは dataset に文字列化せず、カードの _item からたどる
+            card._refs.img._card = card;
+            fragment.appendChild(card);
+            cardPool.push(card);
+            if (cardVisibilityObserver) cardVisibilityObserver.observe(card);
+            return card;
+        }
+
+        function updateCard(card, item, viewedItems) {
+            const refs = card._refs;
+            card._item = item;
+            let cardClass = 'card';
+            // Mark unplayed items
+            if (item.playCount === 0) {
+                cardClass += ' unplayed';
+            } else if (item.playCount === 1) {
+                cardClass += ' played-once';
+            }
+            card.className = cardClass;
+            hoverState.delete(refs.img);
+            if (lazyObserver) {
+                lazyObserver.observe(refs.img);
+            } else if (refs.img.getAttribute('src') !== item.thumbnailUrl) {
+                refs.img.src = item.thumbnailUrl;
+            }
+            // 新着バッジを表示（localStorageで閲覧済みチェック）
+            refs.badge.hidden = !(item.isNew && !viewedItems.has(item.hash));
+            refs.title.textContent = item.name;
+            refs.title.title = item.relativePath;
+            refs.info.textContent = item.infoText;
+            refs.rating.textContent = item.ratingText;
+            refs.viewLink.href = item.viewUrl;
+            card.style.display = '';
+        }
+
+        // DOM への書き込みは次のフレームにまとめ、同じフレーム内の再描画要求は最後の 1 回だけ反映する
         function renderMedia(items) {
             currentSortedData = items;
-            grid.innerHTML = '';
-            anchors.innerHTML = '';
-            let anchorIndex = 1;
-            items.forEach((item, index) => {
-                if (index > 0 && index % 20 === 0) {
-                    const anchor = document.createElement('div');
-                    anchor.id = `anchor-${anchorIndex}`;
-                    anchor.innerHTML = `<a href="#top">TOPに戻る</a>`;
-                    grid.appendChild(anchor);
-                    // ページ冒頭にリンク追加
-                    const link = document.createElement('a');
-                    link.href = `#anchor-${anchorIndex}`;
-                    link.textContent = `${index + 1}件目`;
-                    anchors.appendChild(link);
-                    anchors.appendChild(document.createTextNode(' '));
-                    anchorIndex++;
+            viewedItemsCache = loadViewedItems();
+            renderFull = true;
+            scheduleRender();
+        }
+
+        function scheduleRender() {
+            if (pendingRender === null) {
+                pendingRender = requestAnimationFrame(() => {
+                    pendingRender = null;
+                    const full = renderFull;
+                    renderFull = false;
+                    applyRender(currentSortedData, full);
+                });
+            }
+        }
+
+        function gridColumns() {
+            return getComputedStyle(grid).gridTemplateColumns.split(' ').filter(Boolean).length || 1;
+        }
+
+        // 件数が VIRTUALIZE_THRESHOLD 以上のときは、表示範囲とその前後 OVERSCAN_ROWS 行を含む ROW_BATCH 行単位のカードだけを描画し、
+        // 残りの行は grid の上下パディングで高さだけ確保してスクロールバーの長さを保つ
+        function visibleRange(items) {
+            const columns = gridColumns();
+            const height = rowHeight || DEFAULT_ROW_HEIGHT;
+            const gridTop = grid.getBoundingClientRect().top + window.scrollY;
+            const totalRows = Math.ceil(items.length / columns);
+            // 描画範囲は ROW_BATCH 行単位に丸め、境界をまたいだときだけまとめて入れ替える
+            const topRow = Math.floor((window.scrollY - gridTop) / height) - OVERSCAN_ROWS;
+            const bottomRow = Math.ceil((window.scrollY + window.innerHeight - gridTop) / height) + OVERSCAN_ROWS;
+            const firstRow = Math.min(totalRows, Math.max(0, Math.floor(topRow / ROW_BATCH) * ROW_BATCH));
+            const lastRow = Math.min(totalRows, Math.max(firstRow, Math.ceil(bottomRow / ROW_BATCH) * ROW_BATCH));
+            return {
+                start: firstRow * columns,
+                end: Math.min(items.length, lastRow * columns),
+                padTop: firstRow * height,
+                padBottom: (totalRows - lastRow) * height,
+                columns,
+                gridTop,
+                height,
+            };
+        }
+
+        // 既存ノードの中身だけを書き換え、足りない分だけ追加し、余った分は削除せず隠す。
+        // 新しいノードは DocumentFragment に組み立ててから一度で grid に追加する
+        function applyRender(items, full) {
+            const virtual = items.length >= VIRTUALIZE_THRESHOLD;
+            // レイアウトの読み取りは書き込みより先に済ませる
+            const range = virtual ? visibleRange(items) : {start: 0, end: items.length, padTop: 0, padBottom: 0};
+            if (!full && virtualRange && range.start === virtualRange.start && range.end === virtualRange.end
+                    && range.padTop === virtualRange.padTop && range.padBottom === virtualRange.padBottom) {
+                return;
+            }
+            virtualRange = range;
+            const fragment = document.createDocumentFragment();
+            const count = range.end - range.start;
+            const total = Math.max(count, cardPool.length);
+            for (let i = 0; i < total; i++) {
+                if (i < count) {
+                    const card = cardPool[i] || createCard(i, fragment);
+                    const item = items[range.start + i];
+                    // スクロールによる再描画では、同じ項目を表示しているカードは書き換えない
+                    if (full || card._item !== item) updateCard(card, item, viewedItemsCache);
+                } else {
+                    cardPool[i].style.display = 'none';
+                    cardPool[i]._item = null;
+                    hoverState.delete(cardPool[i]._refs.img);
+                    // 隠したカードの画像は読み込む必要がないので監視をやめる
+                    if (lazyObserver) lazyObserver.unobserve(cardPool[i]._refs.img);
                 }
-                const card = cardTemplate.content.firstElementChild.cloneNode(true);
-                const thumbWrapper = card.querySelector('.thumb-wrapper');
-                const img = card.querySelector('img');
-                img.src = item.thumbnailUrl;
-                img.dataset.thumbnail = item.thumbnailUrl;
-                img.dataset.type = item.type;
-                img.dataset.preview = (item.previewUrls || []).join('|');
-                img.addEventListener('mouseenter', handleHoverStart);
-                img.addEventListener('mouseleave', handleHoverEnd);
-
-                // 新着バッジを表示（localStorageで閲覧済みチェック）
-                if (item.isNew) {
-                    const viewedItems = JSON.parse(localStorage.getItem('viewedMediaItems') || '[]');
-                    if (!viewedItems.includes(item.hash)) {
-                        const badge = document.createElement('div');
-                        badge.className = 'new-badge';
-                        badge.textContent = 'NEW';
-                        thumbWrapper.appendChild(badge);
-                    }
+            }
+            if (fragment.childNodes.length) {
+                grid.appendChild(fragment);
+            }
+            // 仮想化中はグリッド内のアンカーを出さない（行の高さを揃えるため）
+            anchorPool.forEach((anchor, index) => {
+                anchor.style.display = !virtual && (index + 1) * 20 < items.length ? '' : 'none';
+            });
+            grid.classList.toggle('virtual', virtual);
+            grid.style.paddingTop = virtual ? `${range.padTop}px` : '';
+            grid.style.paddingBottom = virtual ? `${range.padBottom}px` : '';
+            if (full) {
+                const anchorParts = [];
+                for (let index = 20; index < items.length; index += 20) {
+                    // ページ冒頭にリンク追加（仮想化中は該当行までスクロールさせる）
+                    anchorParts.push(virtual
+                        ? `<a href="#" data-index="${index}">${index + 1}件目</a>`
+                        : `<a href="#anchor-${index / 20}">${index + 1}件目</a>`);
                 }
+                anchors.innerHTML = anchorParts.join(' ');
+            }
+            if (virtual && !rowHeight) {
+                requestAnimationFrame(measureRowHeight);
+            }
+        }
 
-                // Mark unplayed items
-                if (item.playCount === 0) {
-                    card.classList.add('unplayed');
-                } else if (item.playCount === 1) {
-                    card.classList.add('played-once');
-                }
+        // 描画済みのカードから 1 行分の高さを測り、見積もりと違えば描画し直す
+        function measureRowHeight() {
+            const card = cardPool.find((node) => node._item);
+            if (!card) return;
+            const measured = card.offsetHeight + (parseFloat(getComputedStyle(grid).rowGap) || 0);
+            if (measured > 0 && Math.abs(measured - rowHeight) > 1) {
+                rowHeight = measured;
+                renderFull = true;
+                scheduleRender();
+            }
+        }
 
-                const titleEl = card.querySelector('.title');
-                titleEl.textContent = item.name;
-                titleEl.title = item.relativePath;
-                const infoParts = [`${item.type}`, formatBytes(item.size)];
-                if (item.type === 'video' && typeof item.duration === 'number') {
-                    const formatted = formatDuration(item.duration);
-                    if (formatted) infoParts.push(formatted);
-                }
-                card.querySelector('.info').textContent = infoParts.filter(Boolean).join(' / ');
-                card.querySelector('.rating').textContent = `評価: ${item.rating} / 再生: ${item.playCount}回`;
-
-                card.querySelector('.rate-up').addEventListener('click', () => vote(item, 1, card));
-                card.querySelector('.rate-down').addEventListener('click', () => vote(item, -1, card));
-                
-                const viewLink = card.querySelector('.view-link');
-                viewLink.href = item.viewUrl;
-                // 詳細ボタンクリック時にlocalStorageに記録し、NEWバッジを削除
-                viewLink.addEventListener('click', () => {
-                    markItemAsViewed(item.hash, thumbWrapper);
-                });
+        function onViewportChange() {
+            if (currentSortedData.length >= VIRTUALIZE_THRESHOLD) scheduleRender();
+        }
 
-                grid.appendChild(card);
+        window.addEventListener('scroll', onViewportChange, {passive: true});
+        window.addEventListener('resize', () => {
+            rowHeight = 0;
+            renderFull = true;
+            onViewportChange();
+        });
+
+        anchors.addEventListener('click', (event) => {
+            const link = event.target.closest('a[data-index]');
+            if (!link || !virtualRange || virtualRange.columns === undefined) return;
+            event.preventDefault();
+            const row = Math.floor(Number(link.dataset.index) / virtualRange.columns);
+            window.scrollTo(0, virtualRange.gridTop + row * virtualRange.height);
+        });
+
+        grid.addEventListener('click', (event) => {
+            const target = event.target.closest('.rate-up, .rate-down, .view-link');
+            if (!target) return;
+            const card = target.closest('.card');
+            const item = card._item;
+            if (!item) return;
+            if (target.classList.contains('view-link')) {
+                // 詳細ボタンクリック時にlocalStorageに記録し、NEWバッジを削除
+                markItemAsViewed(item.hash, card);
+            } else {
+                vote(item, target.classList.contains('rate-up') ? 1 : -1, card);
+            }
+        });
+        // mouseenter/mouseleave はバブリングしないのでキャプチャで受ける
+        grid.addEventListener('mouseenter', handleHoverStart, true);
+        grid.addEventListener('mouseleave', handleHoverEnd, true);
+
+        // 続けて押された評価は VOTE_BATCH_MS の間まとめ、/api/rate-batch へ 1 回で送る
+        function queueVote(item, delta) {
+            return new Promise((resolve, reject) => {
+                pendingVotes.push({hash: item.hash, delta, resolve, reject});
+                clearTimeout(voteFlushTimer);
+                voteFlushTimer = setTimeout(flushVotes, VOTE_BATCH_MS);
             });
         }
 
+        async function flushVotes() {
+            const batch = pendingVotes.splice(0);
+            try {
+                const response = await fetch('/api/rate-batch', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({votes: batch.map(({hash, delta}) => ({hash, delta}))}),
+                });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const payload = await response.json();
+                batch.forEach((pending) => pending.resolve(payload.ratings[pending.hash]));
+            } catch (err) {
+                batch.forEach((pending) => pending.reject(err));
+            }
+        }
+
         async function vote(item, delta, card) {
-            const response = await fetch('/api/rate', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({hash: item.hash, delta}),
-            });
-            if (!response.ok) return;
-            const payload = await response.json();
-            item.rating = payload.rating;
-            card.querySelector('.rating').textContent = `評価: ${item.rating}`;
+            try {
+                item.rating = await queueVote(item, delta);
+            } catch (err) {
+                console.error('評価の更新に失敗:', err);
+                return;
+            }
+            // 待っている間にカードが別の項目へ割り当て直されていれば表示は触らない
+            item.ratingText = ratingText(item);
+            if (card._item === item) card._refs.rating.textContent = item.ratingText;
         }
 
-        function markItemAsViewed(hash, thumbWrapper) {
+        function markItemAsViewed(hash, card) {
             try {
                 const viewedItems = JSON.parse(localStorage.getItem('viewedMediaItems') || '[]');
                 if (!viewedItems.includes(hash)) {
                     viewedItems.push(hash);
                     localStorage.setItem('viewedMediaItems', JSON.stringify(viewedItems));
                 }
+                viewedItemsCache.add(hash);
                 // NEWバッジを削除
-                const badge = thumbWrapper.querySelector('.new-badge');
-                if (badge) {
-                    badge.remove();
-                }
+                card._refs.badge.hidden = true;
             } catch (err) {
                 console.error('閲覧済みマークの記録に失敗:', err);
             }
         }
 
         function handleHoverStart(event) {
-            const img = event.currentTarget;
-            const previews = (img.dataset.preview || '').split('|').filter(Boolean);
+            const img = event.target;
+            if (!img._card) return;
+            const item = img._card._item;
+            const previews = (item && item.previewUrls) || [];
             if (!previews.length) return;
-            let index = 0;
-            hoverTimers.set(img, setInterval(() => {
-                img.src = previews[index % previews.length];
-                index++;
-            }, 500));
+            // 最初のホバーで全プレビューを先読みし、切り替え時には読み込み済みの画像が使われるようにする。
+            // カードは使い回されるので、どの項目の先読みかも一緒に持つ
+            if (img._previewCache === undefined || img._previewCache.item !== item) {
+                img._previewCache = {
+                    item,
+                    images: previews.map((url) => {
+                        const preload = new Image();
+                        preload.decoding = 'async';
+                        preload.src = url;
+                        return preload;
+                    }),
+                };
+            }
+            hoverState.set(img, {img, card: img._card, previews, index: 0, lastSwap: performance.now()});
+            if (hoverFrame === null) hoverFrame = requestAnimationFrame(hoverTick);
         }
 
         function handleHoverEnd(event) {
-            const img = event.currentTarget;
-            clearInterval(hoverTimers.get(img));
-            hoverTimers.delete(img);
-            img.src = img.dataset.thumbnail;
+            const img = event.target;
+            if (!hoverState.delete(img)) return;
+            // 隠されて項目を失ったカードは元に戻すサムネイルがない
+            const item = img._card && img._card._item;
+            if (item) img.src = item.thumbnailUrl;
         }
 
+        // 画面外にスクロールしたカードのプレビューは進めない。タブが非表示の間はループ自体を止める
+        function hoverTick(now) {
+            for (const state of hoverState.values()) {
+                if (cardVisibilityObserver && !visibleCards.has(state.card)) continue;
+                if (now - state.lastSwap >= HOVER_INTERVAL_MS) {
+                    state.img.src = state.previews[state.index++ % state.previews.length];
+                    state.lastSwap = now;
+                }
+            }
+            hoverFrame = hoverState.size && !document.hidden ? requestAnimationFrame(hoverTick) : null;
+        }
+
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) {
+                if (hoverFrame !== null) cancelAnimationFrame(hoverFrame);
+                hoverFrame = null;
+            } else if (hoverState.size && hoverFrame === null) {
+                hoverFrame = requestAnimationFrame(hoverTick);
+            }
+        });
+
         async function refreshIndex() {
             refreshBtn.disabled = true;
             await fetch('/api/refresh', {method: 'POST'});
+            mediaResponseCache.clear();
             await loadMedia();
             refreshBtn.disabled = false;
         }
@@ -1179,12 +2419,28 @@ INDEX_TEMPLATE = """
             }
             moveNegativeBtn.disabled = true;
             moveNegativeBtn.textContent = '移動中...';
+            // 応答を待たずにマイナス評価のカードを消しておき、移動に失敗した分だけ後で戻す
+            const snapshot = currentMediaData;
+            const movingItems = snapshot.filter(item => item.rating < 0);
+            currentMediaData = snapshot.filter(item => item.rating >= 0);
+            sortAndRenderMedia();
             try {
                 const response = await fetch('/api/move-negative', {method: 'POST'});
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
                 const data = await response.json();
+                const failed = new Set(data.failed_files || []);
+                const rolledBackItems = movingItems.filter(item => failed.has(item.relativePath));
+                if (rolledBackItems.length) {
+                    currentMediaData = currentMediaData.concat(rolledBackItems);
+                    sortAndRenderMedia();
+                }
+                mediaResponseCache.clear();
+                // サーバー側の再走査結果との突き合わせは裏で読み直して行う
+                loadMedia();
                 alert(`移動完了: ${data.moved}件\\n失敗: ${data.failed}件`);
-                await loadMedia();
             } catch (err) {
+                currentMediaData = snapshot;
+                sortAndRenderMedia();
                 alert('移動処理でエラーが発生しました');
                 console.error(err);
             } finally {
@@ -1193,10 +2449,16 @@ INDEX_TEMPLATE = """
             }
         }
 
-        includeSubfolders.addEventListener('change', loadMedia);
-        ratingFilter.addEventListener('change', loadMedia);
-        ratingValue.addEventListener('change', loadMedia);
-        playCountFilter.addEventListener('change', loadMedia);
+        // フィルタを続けて切り替えたときは最後の操作から LOAD_DEBOUNCE_MS 後に 1 回だけ読み込む
+        function loadMediaDebounced() {
+            clearTimeout(loadDebounceTimer);
+            loadDebounceTimer = setTimeout(loadMedia, LOAD_DEBOUNCE_MS);
+        }
+
+        includeSubfolders.addEventListener('change', loadMediaDebounced);
+        ratingFilter.addEventListener('change', loadMediaDebounced);
+        ratingValue.addEventListener('change', loadMediaDebounced);
+        playCountFilter.addEventListener('change', loadMediaDebounced);
         sortBy.addEventListener('change', sortAndRenderMedia);
         sortOrder.addEventListener('change', sortAndRenderMedia);
         refreshBtn.addEventListener('click', refreshIndex);
@@ -1260,6 +2522,9 @@ VIEW_TEMPLATE = """
     <script>
         const hash = '{{ entry.hash }}';
         let playCounted = false;
+        // 同じ動画を PLAY_THROTTLE_MS 以内に開き直したときは再生回数を送らない
+        const PLAY_THROTTLE_MS = 5 * 60 * 1000;
+        const lastPlayKey = `play:${hash}`;
 
         async function vote(delta) {
             try {
@@ -1280,6 +2545,13 @@ VIEW_TEMPLATE = """
         async function countPlay() {
             if (playCounted) return;
             playCounted = true;
+            try {
+                const lastPlayed = Number(localStorage.getItem(lastPlayKey) || 0);
+                if (Date.now() - lastPlayed < PLAY_THROTTLE_MS) return;
+                localStorage.setItem(lastPlayKey, String(Date.now()));
+            } catch (err) {
+                console.error('localStorageの読み書きに失敗:', err);
+            }
             try {
                 const response = await fetch('/api/play', {
                     method: 'POST',
@@ -1322,12 +2594,19 @@ VIEW_TEMPLATE = """
 </html>
 """
 
+# 一覧ページはテンプレート変数を使わないので起動時に一度だけ描画しておき、
+# 詳細ページもテンプレートのコンパイルは起動時の一度だけにする
+INDEX_HTML = app.jinja_env.from_string(INDEX_TEMPLATE).render()
+VIEW_PAGE_TEMPLATE = app.jinja_env.from_string(VIEW_TEMPLATE)
+
 
 def main() -> None:
     host = os.environ.get("MEDIA_VIEWER_HOST", "0.0.0.0")
     port = int(os.environ.get("MEDIA_VIEWER_PORT", "8080"))
     log(f"サーバーを起動します: http://{host}:{port}")
-    app.run(host=host, port=port, debug=False)
+    # 動画の配信中も一覧や API に応答できるよう、リクエストごとにスレッドで処理する（Flask 1.0 以降の既定と同じ）。
+    # 常用する場合の gunicorn での起動方法は README を参照
+    app.run(host=host, port=port, debug=False, threaded=True)
 
 
 if __name__ == "__main__":
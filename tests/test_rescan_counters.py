@@ -0,0 +1,92 @@
+"""走査中に届いた評価・再生回数が、走査結果の差し替えで巻き戻らないことを確かめる。
+
+generate_webviewer は読み込み時に自分のフォルダを走査するので、一時フォルダへコピーしてから読み込む。
+"""
+import atexit
+import importlib.util
+import logging
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# 1x1 の GIF。Pillow がなくても用意でき、末尾に付けたバイトはデコード時に無視されるのでハッシュだけを変えられる
+TINY_GIF = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+
+class RescanCounterTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = Path(tempfile.mkdtemp())
+        shutil.copy(ROOT / "generate_webviewer.py", cls.root)
+        (cls.root / "a.gif").write_bytes(TINY_GIF + b"a")
+        spec = importlib.util.spec_from_file_location("webviewer_under_test", cls.root / "generate_webviewer.py")
+        cls.gw = importlib.util.module_from_spec(spec)
+        # dataclass の処理でモジュールを引くので、実行前に登録しておく
+        sys.modules[spec.name] = cls.gw
+        spec.loader.exec_module(cls.gw)
+        cls.client = cls.gw.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        atexit.unregister(cls.gw.close_db)
+        cls.gw.close_db()
+        # basicConfig がルートロガーに付けたログファイルのハンドラーを外してから一時フォルダを消す
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            if Path(getattr(handler, "baseFilename", "/")).is_relative_to(cls.root):
+                root_logger.removeHandler(handler)
+                handler.close()
+        sys.modules.pop(cls.gw.__name__, None)
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    def rate(self, media_hash, delta=1):
+        return self.client.post("/api/rate", json={"hash": media_hash, "delta": delta}).get_json()["rating"]
+
+    def db_score(self, media_hash):
+        self.gw.COUNTER_QUEUE.join()
+        with self.gw.DB_LOCK:
+            row = self.gw.DB.execute("SELECT score FROM ratings WHERE hash = ?", (media_hash,)).fetchone()
+        return row[0] if row else 0
+
+    def refresh_voting_after_fetch(self, media_hash, votes):
+        """走査が評価を読み込んだ直後（サムネイル生成を待っている間）に投票を割り込ませる。"""
+        original = self.gw.fetch_metadata
+        fired = []
+
+        def fetch_then_vote(hashes):
+            result = original(hashes)
+            if not fired:
+                fired.append(True)
+                for _ in range(votes):
+                    self.rate(media_hash)
+            return result
+
+        self.gw.fetch_metadata = fetch_then_vote
+        try:
+            self.gw.refresh_media_index()
+        finally:
+            self.gw.fetch_metadata = original
+
+    def test_votes_on_listed_file_during_rescan_are_kept(self):
+        entry = self.gw.MEDIA_LOOKUP["a.gif"]
+        before = entry.rating
+        self.refresh_voting_after_fetch(entry.media_hash, votes=3)
+        self.assertEqual(self.gw.MEDIA_LOOKUP["a.gif"].rating, before + 3)
+        self.assertEqual(self.rate(entry.media_hash), before + 4)
+        self.assertEqual(self.db_score(entry.media_hash), before + 4)
+
+    def test_votes_on_new_file_during_rescan_are_kept(self):
+        path = self.root / "b.gif"
+        path.write_bytes(TINY_GIF + b"b")
+        media_hash = self.gw.hash_media_batch([(path, path.stat())])[0]
+        self.refresh_voting_after_fetch(media_hash, votes=2)
+        self.assertEqual(self.gw.MEDIA_LOOKUP["b.gif"].rating, 2)
+        self.assertEqual(self.rate(media_hash), 3)
+        self.assertEqual(self.db_score(media_hash), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()